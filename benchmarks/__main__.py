@@ -0,0 +1,103 @@
+'''
+Reproducible benchmark suite: seeds the tables, micro-benchmarks the ORM and load-tests the busiest pages.
+
+Runs against an in-process SQLite stand-in by default, or a MySQL/MariaDB server given with
+--mysql, whose --database (qa_bench unless given) is dropped and reseeded. Run from the project root:
+
+    python -m benchmarks --scale 10000                          -> report p50/p95/p99, throughput and queries
+    python -m benchmarks --scale 10000 --save baseline.json     -> keep the results as a baseline
+    python -m benchmarks --scale 10000 --baseline baseline.json -> flag regressions, exit 1 if any
+
+Numbers are only comparable between runs at the same scale, on the same backend and machine.
+'''
+import os
+import platform
+import tempfile
+from functools import partial
+import click
+import pymysql
+import server#registers the routes
+from flask_app import app, db
+from flask_app.config.mysqlconnection import configure_pool
+from flask_app.config.orm import Schema
+from flask_app.config.passwords import hash_password
+from benchmarks import load, micro, report, seed, standin
+
+PASSWORD = "benchmark"
+
+@click.command()
+@click.option("--scale",default=1000,show_default=True,help="Number of questions seeded, with twice as many answers and a tenth as many users.")
+@click.option("--mysql",metavar="HOST",help="Benchmark the MySQL/MariaDB server on HOST instead of the SQLite stand-in.")
+@click.option("--database",default="qa_bench",show_default=True,help="Database dropped and reseeded on the MySQL server.")
+@click.option("--user",default="root",show_default=True,help="MySQL user.")
+@click.option("--password",default="root",show_default=True,help="MySQL password.")
+@click.option("--file",type=click.Path(),help="SQLite file of the stand-in, a temporary one if not given.")
+@click.option("--no-seed",is_flag=True,help="Reuse the rows seeded by an earlier run at the same scale.")
+@click.option("--seed","random_seed",default=0,show_default=True,help="Seed of the generated rows and the ids requested.")
+@click.option("--rounds",default=12,show_default=True,help="bcrypt cost factor of the seeded passwords.")
+@click.option("--iterations",default=200,show_default=True,help="Calls of each ORM operation.")
+@click.option("--requests",default=200,show_default=True,help="Requests sent to each page.")
+@click.option("--concurrency",default=8,show_default=True,help="Threads sending requests at once.")
+@click.option("--no-cache",is_flag=True,help="Disable the query cache of every class.")
+@click.option("--only",type=click.Choice(["micro","load"]),help="Run only the micro-benchmarks or only the load test.")
+@click.option("--save",type=click.Path(),help="Write the results to this JSON file.")
+@click.option("--baseline",type=click.Path(exists=True),help="Compare the results against this JSON file.")
+@click.option("--tolerance",default=0.25,show_default=True,help="Slowdown of p50/p95 flagged as a regression, as a fraction.")
+def main(scale, mysql, database, user, password, file, no_seed, random_seed, rounds, iterations, requests, concurrency, no_cache, only, save, baseline, tolerance):
+    if mysql:
+        if database == db:
+            raise click.BadParameter(f"refusing to drop and reseed the app's own database {db}",param_hint="--database")
+        setup = pymysql.connect(host=mysql,user=user,password=password)
+        with setup.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        setup.close()
+        configure_pool(db,host=mysql,user=user,password=password,connect=lambda **options : pymysql.connect(**dict(options,db=database)))
+    else:
+        if file is None:
+            file = os.path.join(tempfile.mkdtemp(),"bench.sqlite3")
+        configure_pool(db,connect=partial(standin.connect,file))
+    if no_cache:
+        for model in Schema.models.values():
+            model.cache = None
+    app.config["BCRYPT_LOG_ROUNDS"] = rounds#no rehash on login
+    rows = {"users" : max(scale//10,1),"questions" : scale,"answers" : scale*2}
+    if not no_seed:
+        click.echo(f"Seeding {rows}...")
+        seed.reset("mysql" if mysql else "sqlite")
+        seed.seed(scale,hash_password(PASSWORD),random_seed)
+    results = {
+        "meta" : {
+            "scale" : scale,
+            "backend" : "mysql" if mysql else "sqlite",
+            "cache" : not no_cache,
+            "iterations" : iterations,
+            "requests" : requests,
+            "concurrency" : concurrency,
+            "python" : platform.python_version(),
+            "machine" : platform.machine()
+        }
+    }
+    click.echo(report.header())
+    if only != "load":
+        results["micro"] = micro.run(rows,iterations,random_seed,search=bool(mysql))
+        for name,summary in results["micro"].items():
+            click.echo(report.line(name,summary))
+    if only != "micro":
+        results["load"] = load.run(rows,PASSWORD,requests,concurrency,random_seed)
+        for name,summary in results["load"].items():
+            click.echo(report.line(name,summary)+(f"  {summary['errors']} error(s)" if summary["errors"] else ""))
+    if save:
+        report.save(save,results)
+    if baseline:
+        before = report.load(baseline)
+        if any(before.get("meta",{}).get(key) != results["meta"][key] for key in ("scale","backend","cache")):
+            click.echo("Warning: the baseline was taken at another scale, on another backend or with the cache set differently.")
+        regressions = report.compare(results,before,tolerance)
+        for name,metric,old,new in regressions:
+            click.echo(f"REGRESSION {name} {metric}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            raise SystemExit(1)
+        click.echo("No regressions.")
+
+if __name__ == "__main__":#workers of the password pool are spawned and import this module again
+    main()
@@ -0,0 +1,71 @@
+'''
+Measures hydration throughput, the rate rows are turned into model instances, at 100k rows.
+
+Builds instances from rows held in memory, through from_row row by row, through the
+constructor generated for the rows' columns and from tuples as a tuple cursor reads them.
+Then reads the rows back from a seeded SQLite stand-in through retrieve_all, with and without
+an identity map, and iter_all, so the cost of the database is included. Run from the project root:
+
+    python -m benchmarks.hydration [rows]
+'''
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+from flask_app import app, db
+from flask_app.config.mysqlconnection import configure_pool
+from flask_app.models.question_model import Question
+from benchmarks import seed, standin
+from benchmarks.memory import ROWS
+
+def timed(func, rounds=5):
+    '''
+    Returns the best of rounds timings of func, in seconds.
+    '''
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best,time.perf_counter()-start)
+    return best
+
+def in_memory(count):
+    '''
+    Returns name -> seconds to build count Question instances from rows already in memory.
+    '''
+    rows = [ROWS[Question](i) for i in range(count)]
+    keys = tuple(rows[0])
+    values = [tuple(row.values()) for row in rows]
+    make = Question.constructor(keys,tuples=True)
+    def identified():
+        with app.test_request_context():
+            Question.instances(rows)
+    return {
+        "from_row, row by row" : timed(lambda : [Question.from_row(row) for row in rows]),
+        "instances" : timed(lambda : Question.instances(rows)),
+        "instances, identity map" : timed(identified),
+        "constructor, tuples" : timed(lambda : [make(row) for row in values])
+    }
+
+def from_database(count):
+    '''
+    Returns name -> seconds to read count questions from the stand-in and build their instances.
+    '''
+    configure_pool(db,connect=partial(standin.connect,os.path.join(tempfile.mkdtemp(),"hydration.sqlite3")))
+    Question.cache = None#every round reads the rows
+    seed.reset("sqlite")
+    seed.seed(count,"x")
+    def identified():
+        with app.test_request_context():
+            Question.retrieve_all()
+    return {
+        "retrieve_all" : timed(Question.retrieve_all,3),
+        "retrieve_all, identity map" : timed(identified,3),
+        "iter_all, tuples" : timed(lambda : list(Question.iter_all(batch_size=10_000)),3)
+    }
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for name,seconds in {**in_memory(count),**from_database(count)}.items():
+        print(f"{name:<30}{seconds*1000:>9.1f} ms{count/seconds:>12,.0f} rows/s")
@@ -0,0 +1,74 @@
+'''
+Load generator driving the app's busiest pages through Flask's test client.
+
+Each scenario is requested a fixed number of times by a pool of threads, each with its own
+client, so the app sees concurrent requests the way it does behind a threaded server (minus the
+network). Queries per request are read from the Server-Timing header the ORM adds to every response.
+'''
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask_app import app
+from benchmarks.report import summarize
+
+SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+def scenarios(rows, password):
+    '''
+    Returns name -> function sending one request with a client and a random generator, returning the response.
+    '''
+    def logged_in(client, rng):
+        with client.session_transaction() as session:
+            session['id'] = rng.randint(1,rows["users"])
+    def dashboard(client, rng):
+        logged_in(client,rng)
+        return client.get('/dashboard')
+    def view_question(client, rng):
+        logged_in(client,rng)
+        return client.get(f'/questions/{rng.randint(1,rows["questions"])}')
+    def login(client, rng):
+        return client.post('/users/login',data={"login_email" : f"user{rng.randint(1,rows['users'])}@example.com","login_password" : password})
+    return {
+        "GET /dashboard" : dashboard,
+        "GET /questions/<id>" : view_question,
+        "POST /users/login" : login
+    }
+
+def drive(scenario, requests, concurrency, seed=0):
+    '''
+    Sends requests requests of a scenario from concurrency threads at once.
+
+    Responses other than 2xx and 3xx are counted as errors.
+
+    Returns
+    -------
+        Summary of the requests, see report.summarize, along with the number of errors.
+    '''
+    local = threading.local()
+    seeds = iter(range(seed,seed+concurrency))
+    seeds_lock = threading.Lock()
+    def send(_):
+        if not hasattr(local,"client"):
+            with seeds_lock:
+                local.rng = random.Random(next(seeds))
+            local.client = app.test_client()
+        start = time.perf_counter()
+        response = scenario(local.client,local.rng)
+        duration = time.perf_counter()-start
+        found = SERVER_TIMING.search(response.headers.get("Server-Timing",""))
+        return duration,int(found.group(1)) if found else 0,response.status_code < 400
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(send,range(requests)))
+    elapsed = time.perf_counter()-start
+    summary = summarize([duration for duration,_,_ in results],[queries for _,queries,_ in results],elapsed)
+    summary["errors"] = sum(1 for _,_,ok in results if not ok)
+    return summary
+
+def run(rows, password, requests=200, concurrency=8, seed=0):
+    '''
+    Drives every scenario, returning name -> summary.
+    '''
+    return {name : drive(scenario,requests,concurrency,seed) for name,scenario in scenarios(rows,password).items()}
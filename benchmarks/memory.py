@@ -0,0 +1,44 @@
+'''
+Measures the memory held by each model instance built from a full row.
+
+Rows are built in memory, so no database is needed. Run from the project root:
+
+    python -m benchmarks.memory [count]
+
+Prints the bytes per instance next to BASELINE, measured with the same rows before model
+classes had __slots__, when every instance kept a __dict__ and four closures of its own.
+'''
+import datetime
+import sys
+import tracemalloc
+from flask_app.models.question_model import Question
+from flask_app.models.answer_model import Answer
+from flask_app.models.user_model import User
+
+NOW = datetime.datetime(2024,1,1)
+
+ROWS = {
+    User : lambda i : {"id" : i,"username" : f"user{i}","email" : f"user{i}@example.com","password" : "$2b$12$"+"x"*53,"question_count" : 3,"answer_count" : 7,"created_at" : NOW,"updated_at" : NOW},
+    Question : lambda i : {"id" : i,"question" : f"Question number {i} asked here?","description" : "Some description of the question","answered" : 0,"asker_id" : i,"answer_count" : 2,"created_at" : NOW,"updated_at" : NOW},
+    Answer : lambda i : {"id" : i,"answer" : f"Answer number {i} to the question","selected" : 0,"answerer_id" : i,"question_id" : i,"created_at" : NOW,"updated_at" : NOW}
+}
+
+BASELINE = {User : 1160,Question : 1160,Answer : 1151}#bytes/instance of 100k instances, before __slots__
+
+def measure(model, count):
+    '''
+    Returns the bytes allocated per instance when building count instances of model, not counting the rows themselves.
+    '''
+    rows = [ROWS[model](i) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [model.build(row) for row in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after-before-sys.getsizeof(instances))/len(instances)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{'':<10}{'before':>8}{'after':>8}  bytes/instance")
+    for model in ROWS:
+        print(f"{model.__name__:<10}{BASELINE[model]:>8}{measure(model,count):>8.0f}")
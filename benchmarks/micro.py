@@ -0,0 +1,90 @@
+'''
+Micro-benchmarks of the Schema, Query, relationship and MtM operations, one call at a time on one thread.
+
+Each call runs in its own request context, as it would when serving, so the identity map and the
+query cache behave as they do when serving. Ids are drawn at random (from a seeded generator)
+across the whole table, so cached classes see a realistic mix of hits and misses.
+'''
+import random
+import threading
+import time
+from flask_app import app
+from flask_app.config.mysqlconnection import on_query
+from flask_app.config.orm import MtM, encode_cursor
+from flask_app.models.question_model import Question
+from flask_app.models.answer_model import Answer
+from flask_app.models.user_model import User
+from benchmarks.report import summarize
+
+counts = threading.local()
+
+@on_query
+def count(event):
+    counts.queries = getattr(counts,"queries",0)+1
+
+def operations(rows, rng, search=False):
+    '''
+    Returns name -> function running the operation once, against tables holding the given numbers of rows.
+
+    Writes are paired so the tables end up as they started: every row created (warm-up calls included) is deleted again further down.
+    '''
+    user = lambda : rng.randint(1,rows["users"])
+    question = lambda : rng.randint(1,rows["questions"])
+    created,answers,bulk = [],[],[]
+    newest = Question.query().order_by("created_at",desc=True)
+    ops = {
+        "User.retrieve_one" : lambda : User.retrieve_one(id=user()),
+        "Question.retrieve_one join=asker" : lambda : Question.retrieve_one(id=question(),join=("asker",)),
+        "Question.retrieve_all asker_id" : lambda : Question.retrieve_all(asker_id=user()),
+        "Question.retrieve_all id=[25]" : lambda : Question.retrieve_all(id=[question() for _ in range(25)]),
+        "Question.retrieve_all limit offset" : lambda : Question.retrieve_all(limit=25,offset=question()),
+        "Question.page" : lambda : Question.page(25,desc=True),
+        "Question.page deep" : lambda : Question.page(25,encode_cursor(question()),desc=True),
+        "Question.iter_all asker_id" : lambda : sum(1 for _ in Question.iter_all(asker_id=user())),
+        "Query.filter.order_by.page" : lambda : newest.filter(answered=0).page(25),
+        "materialized.page" : lambda : Question.recent_unanswered.page(25),
+        "has_many.page join=answerer" : lambda : Question.answers.page(Question.build({"id" : question()}),25,join=("answerer",)),
+        "Collection.with_related asker" : lambda : Question.retrieve_all(id=[question() for _ in range(25)]).with_related("asker"),
+        "belongs_to (lazy)" : lambda : Answer.retrieve_one(id=rng.randint(1,rows["answers"])).question,
+        "MtM iterate" : lambda : list(MtM(answerer=User.build({"id" : user()}),question=Question,middle="answers")),
+        "Question.create" : lambda : created.append(Question.create(question="How do I benchmark?",description="Timing every operation",asker_id=user())),
+        "Answer.create (counters)" : lambda : answers.append(Answer.create(answer="Like this",answerer_id=user(),question_id=question())),
+        "Question.update" : lambda : Question.update(id=question(),description="Updated while benchmarking"),
+        "Question.bulk_create 25" : lambda : bulk.extend(Question.bulk_create([{"question" : "Bulk?","description" : "Bulk","asker_id" : user()} for _ in range(25)])),
+        "Question.bulk_update 25" : lambda : Question.bulk_update([question() for _ in range(25)],description="Updated in bulk"),
+        "Answer.delete (counters)" : lambda : Answer.delete(id=answers.pop()),
+        "Question.delete" : lambda : Question.delete(id=created.pop()),
+        "Question.bulk_delete 25" : lambda : Question.bulk_delete([bulk.pop() for _ in range(25)])
+    }
+    if search:#needs a FULLTEXT index, so not on the stand-in
+        ops["Question.search"] = lambda : Question.search(f"{rng.choice(('flask','mysql','session','cache'))} {rng.choice(('login','query','thread','pool'))}")
+    return ops
+
+def measure(func, iterations, warmup=10):
+    '''
+    Times iterations calls of func, after warmup untimed ones.
+
+    Returns
+    -------
+        Summary of the calls, see report.summarize.
+    '''
+    for _ in range(warmup):
+        with app.test_request_context():
+            func()
+    durations,queries = [],[]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with app.test_request_context():
+            counts.queries = 0
+            begin = time.perf_counter()
+            func()
+            durations.append(time.perf_counter()-begin)
+            queries.append(counts.queries)
+    return summarize(durations,queries,time.perf_counter()-start)
+
+def run(rows, iterations=200, seed=0, search=False):
+    '''
+    Runs every operation, returning name -> summary.
+    '''
+    ops = operations(rows,random.Random(seed),search)
+    return {name : measure(func,iterations) for name,func in ops.items()}
@@ -0,0 +1,78 @@
+'''
+Summaries of timing samples and comparison against a saved JSON baseline.
+'''
+import json
+import math
+
+def percentile(samples, p):
+    '''
+    Returns the p-th percentile (nearest rank) of a sorted list of samples.
+    '''
+    if not samples:
+        return 0.0
+    return samples[max(math.ceil(p/100*len(samples))-1,0)]
+
+def summarize(durations, queries, elapsed):
+    '''
+    Summarizes one benchmark.
+
+    Parameters
+    ----------
+        durations (list): Seconds taken by each operation or request.
+
+        queries (list): Number of queries run by each operation or request.
+
+        elapsed (float): Wall time of the whole benchmark in seconds.
+
+    Returns
+    -------
+        Dictionary of the count, p50/p95/p99 and mean latencies in milliseconds, the throughput per second and the mean queries per operation.
+    '''
+    durations = sorted(durations)
+    return {
+        "count" : len(durations),
+        "p50" : percentile(durations,50)*1000,
+        "p95" : percentile(durations,95)*1000,
+        "p99" : percentile(durations,99)*1000,
+        "mean" : sum(durations)/len(durations)*1000 if durations else 0.0,
+        "throughput" : len(durations)/elapsed if elapsed else 0.0,
+        "queries" : sum(queries)/len(queries) if queries else 0.0
+    }
+
+def header():
+    return f"{'':<44}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ops/s':>10}{'queries':>9}"
+
+def line(name, summary):
+    return f"{name:<44}{summary['p50']:>9.2f}{summary['p95']:>9.2f}{summary['p99']:>9.2f}{summary['throughput']:>10.0f}{summary['queries']:>9.1f}"
+
+def save(path, results):
+    with open(path,"w") as file:
+        json.dump(results,file,indent=1)
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+def compare(results, baseline, tolerance=0.25):
+    '''
+    Finds the benchmarks that got slower, or run more queries, than in the baseline.
+
+    Latencies are flagged when their p50 or p95 grew by more than tolerance (a fraction).
+    Query counts barely vary between runs, so any increase of half a query or more is flagged.
+
+    Returns
+    -------
+        List of (benchmark, metric, baseline value, new value) for every regression.
+    '''
+    regressions = []
+    for group in ("micro","load"):
+        for name,after in results.get(group,{}).items():
+            before = baseline.get(group,{}).get(name)
+            if before is None:
+                continue
+            for metric in ("p50","p95"):
+                if after[metric] > before[metric]*(1+tolerance):
+                    regressions.append((f"{group}/{name}",metric,before[metric],after[metric]))
+            if after["queries"] >= before["queries"]+0.5:
+                regressions.append((f"{group}/{name}","queries",before["queries"],after["queries"]))
+    return regressions
@@ -0,0 +1,114 @@
+'''
+Creates the users, questions and answers tables and fills them with reproducible data.
+
+For a scale of n there are n questions, 2n answers and n/10 users. Every value comes from a
+random.Random seeded with the given seed, so two runs at the same scale and seed hold the
+same rows, and the counters are filled in to match them.
+'''
+import datetime
+import random
+from flask_app import db
+from flask_app.config import statements
+from flask_app.config.cache import invalidate
+from flask_app.config.mysqlconnection import connectToMySQL
+
+TABLES = {
+    "users" : "`id` {id}, `username` VARCHAR(255) NOT NULL, `email` VARCHAR(255) NOT NULL, `password` VARCHAR(80) NOT NULL, `question_count` INT NOT NULL DEFAULT 0, `answer_count` INT NOT NULL DEFAULT 0, `created_at` {created}, `updated_at` {updated}",
+    "questions" : "`id` {id}, `question` VARCHAR(255) NOT NULL, `description` TEXT, `answered` TINYINT, `asker_id` INT NOT NULL, `answer_count` INT NOT NULL DEFAULT 0, `created_at` {created}, `updated_at` {updated}",
+    "answers" : "`id` {id}, `answer` TEXT NOT NULL, `selected` TINYINT DEFAULT 0, `answerer_id` INT NOT NULL, `question_id` INT NOT NULL, `created_at` {created}, `updated_at` {updated}"
+}
+INDEXES = [#the foreign key indexes of qa_diagram.mwb
+    ("questions","asker_id"),
+    ("answers","answerer_id"),
+    ("answers","question_id")
+]
+DIALECTS = {
+    "mysql" : {"id" : "INT NOT NULL AUTO_INCREMENT PRIMARY KEY","created" : "DATETIME DEFAULT NOW()","updated" : "DATETIME DEFAULT NOW() ON UPDATE NOW()"},
+    "sqlite" : {"id" : "INTEGER PRIMARY KEY AUTOINCREMENT","created" : "DATETIME DEFAULT CURRENT_TIMESTAMP","updated" : "DATETIME DEFAULT CURRENT_TIMESTAMP"}
+}
+WORDS = ("flask","python","mysql","session","cookie","template","jinja","route","query","index","join","cache","login","password","form",
+    "redirect","deploy","thread","async","cursor","pool","transaction","schema","migration","test","error","request","response","json","static")
+START = datetime.datetime(2024,1,1)
+
+def run(query):
+    if connectToMySQL(db).query_db(query) is False:
+        raise RuntimeError(f"Failed to run: {query}")
+
+def reset(dialect):
+    '''
+    Drops and recreates the tables in the given dialect, "mysql" or "sqlite".
+    '''
+    for table,columns in TABLES.items():
+        run(f"DROP TABLE IF EXISTS `{table}`")
+        run(f"CREATE TABLE `{table}` ({columns.format(**DIALECTS[dialect])})")
+    for table,col in INDEXES:
+        run(f"CREATE INDEX `fk_{table}_{col}_idx` ON `{table}` (`{col}`)")
+    if dialect == "mysql":
+        run("ALTER TABLE `questions` ADD FULLTEXT INDEX `ft_questions_question_description` (`question`, `description`)")
+
+def insert(table, columns, rows, statements_per_transaction=100):
+    '''
+    Inserts rows (tuples of values in column order) with multi-row inserts, a batch of statements per transaction.
+    '''
+    connection = connectToMySQL(db)
+    batch = []
+    for chunk in statements.chunks(rows,connection.packet_size()*9//10):
+        batch.append((statements.insert_many(table,columns,len(chunk)),[val for row in chunk for val in row]))
+        if len(batch) == statements_per_transaction:
+            if connection.transact_db(batch) is False:
+                raise RuntimeError(f"Failed to seed {table}")
+            batch = []
+    if batch and connection.transact_db(batch) is False:
+        raise RuntimeError(f"Failed to seed {table}")
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def seed(scale, password, seed=0):
+    '''
+    Fills the (empty) tables with the rows for the given scale.
+
+    Parameters
+    ----------
+        scale (int): Number of questions. There are twice as many answers and a tenth as many users.
+
+        password (str): Hash stored as every user's password.
+
+        seed (int): Seed of the random choices.
+
+    Returns
+    -------
+        Dictionary of the number of rows in each table.
+    '''
+    rng = random.Random(seed)
+    users,questions,answers = max(scale//10,1),scale,scale*2
+    askers = [rng.randint(1,users) for _ in range(questions)]
+    answerers = [rng.randint(1,users) for _ in range(answers)]
+    answered = [rng.randint(1,questions) for _ in range(answers)]
+    selected = {}#question id -> id of its selected answer
+    for id,question_id in enumerate(answered,1):
+        if question_id not in selected and rng.random() < 0.5:
+            selected[question_id] = id
+    question_counts = [0]*(users+1)
+    answer_counts = [0]*(users+1)
+    answer_totals = [0]*(questions+1)
+    for user_id in askers:
+        question_counts[user_id] += 1
+    for user_id,question_id in zip(answerers,answered):
+        answer_counts[user_id] += 1
+        answer_totals[question_id] += 1
+    insert("users",("id","username","email","password","question_count","answer_count","created_at","updated_at"),(
+        (id,f"user{id}",f"user{id}@example.com",password,question_counts[id],answer_counts[id],START,START)
+        for id in range(1,users+1)
+    ))
+    insert("questions",("id","question","description","answered","asker_id","answer_count","created_at","updated_at"),(
+        (id,f"How do I {sentence(rng,4)}?",sentence(rng,30),int(id in selected),askers[id-1],answer_totals[id],START+datetime.timedelta(minutes=id),START+datetime.timedelta(minutes=id))
+        for id in range(1,questions+1)
+    ))
+    chosen = set(selected.values())
+    insert("answers",("id","answer","selected","answerer_id","question_id","created_at","updated_at"),(
+        (id,sentence(rng,20),int(id in chosen),answerers[id-1],answered[id-1],START+datetime.timedelta(seconds=30*id),START+datetime.timedelta(seconds=30*id))
+        for id in range(1,answers+1)
+    ))
+    invalidate(*TABLES)
+    return {"users" : users,"questions" : questions,"answers" : answers}
@@ -0,0 +1,131 @@
+'''
+In-process stand-in for the MySQL server, backed by a SQLite file.
+
+Speaks the part of pymysql's connection and cursor interface MySQLConnection uses and
+translates the ORM's MySQL dialect (pyformat parameters, IN lists, RAND(), FOR UPDATE) to SQLite,
+so the benchmarks run without a database server:
+
+    configure_pool(db,connect=partial(standin.connect,"bench.sqlite3"))
+
+FULLTEXT search has no SQLite equivalent and fails like any other broken query.
+Timings are not comparable with MySQL's, but regressions in the ORM and controllers show up in both.
+'''
+import datetime
+import re
+import sqlite3
+import pymysql
+
+MAX_ALLOWED_PACKET = 4*1024*1024#MySQL's default
+
+sqlite3.register_adapter(datetime.datetime,lambda val : val.isoformat(" "))
+sqlite3.register_converter("DATETIME",lambda val : datetime.datetime.fromisoformat(val.decode()))
+
+PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s")
+
+def translate(query, data):
+    '''
+    Rewrites a query and its pymysql parameters for SQLite, expanding tuples and lists into one placeholder per value.
+
+    Returns
+    -------
+        The rewritten query and its list of positional parameters.
+    '''
+    query = query.replace("RAND()","RANDOM()").replace(" FOR UPDATE","")#transactions take the write lock when they begin
+    if data is None:#pymysql leaves the query untouched without parameters
+        return query,[]
+    params = []
+    positional = iter(data) if isinstance(data,(list,tuple)) else None
+    def substitute(match):
+        val = data[match.group(1)] if match.group(1) else next(positional)
+        if isinstance(val,(list,tuple,set,frozenset)):
+            params.extend(val)
+            return f"({', '.join('?'*len(val))})"
+        params.append(val)
+        return "?"
+    return PLACEHOLDER.sub(substitute,query),params
+
+class Cursor:
+    def __init__(self, connection, tuples=False):
+        self.connection = connection
+        self.tuples = tuples
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def mogrify(self, query, data=None):
+        query,params = translate(query,data)
+        return f"{query} {params}"
+
+    def execute(self, query, data=None):
+        if query.startswith("SELECT @@max_allowed_packet"):
+            self._rows = [{"size" : MAX_ALLOWED_PACKET}]
+            return 1
+        if query.startswith("SELECT @@auto_increment_increment"):#a multi-row insert takes the next ids in turn
+            self._rows = [{"step" : 1,"mode" : 1}]
+            return 1
+        cursor = self.connection.db.execute(*translate(query,data))
+        if cursor.description:
+            self._rows = [(tuple if self.tuples else dict)(row) for row in cursor.fetchall()]
+            self.rowcount = len(self._rows)
+        else:
+            self._rows = []
+            self.rowcount = cursor.rowcount
+            #pymysql reports the first id of a multi-row insert, sqlite the last
+            self.lastrowid = cursor.lastrowid-cursor.rowcount+1 if cursor.lastrowid and cursor.rowcount > 0 else cursor.lastrowid
+        return self.rowcount
+
+    def fetchall(self):
+        rows,self._rows = self._rows,[]
+        return rows
+
+    def fetchmany(self, size):
+        rows,self._rows = self._rows[:size],self._rows[size:]
+        return rows
+
+    def close(self):
+        self._rows = []
+
+class Connection:
+    def __init__(self, path):
+        '''
+        A connection to the SQLite file at path, in autocommit mode unless a transaction was begun.
+        '''
+        self.db = sqlite3.connect(path,timeout=30,isolation_level=None,check_same_thread=False,detect_types=sqlite3.PARSE_DECLTYPES)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")#readers do not wait on writers
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.open = True
+
+    def cursor(self, cursorclass=None):
+        return Cursor(self,cursorclass is not None and not issubclass(cursorclass,pymysql.cursors.DictCursorMixin))
+
+    def begin(self):
+        self.db.execute("BEGIN IMMEDIATE")#take the write lock up front rather than deadlock upgrading to it
+
+    def commit(self):
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+
+    def rollback(self):
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise sqlite3.InterfaceError("Connection is closed")
+
+    def close(self):
+        self.open = False
+        self.db.close()
+
+def connect(path, **options):
+    '''
+    Opens a connection to the SQLite file at path. Takes, and ignores, the options pymysql.connect would be given.
+    '''
+    return Connection(path)
@@ -1,7 +1,9 @@
 from flask import Flask
 from flask_bcrypt import Bcrypt
+from flask_app.config.sessions import ServerSessionInterface
 
 app = Flask(__name__)
 app.secret_key = "itsasecret"
+app.session_interface = ServerSessionInterface()#the cookie only carries a session id, sessions are kept in instance/sessions.sqlite3 unless SESSION_STORE says otherwise
 db = "qa_db"
 bcrypt = Bcrypt(app)
\ No newline at end of file
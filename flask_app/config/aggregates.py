@@ -0,0 +1,74 @@
+'''
+Maintenance of the aggregates the ORM keeps up to date on write.
+
+Counters declared with belongs_to(..., counter=...) are moved in the same transaction as
+every create, update and delete made through Schema. Writes made around the ORM (by hand,
+by cascading foreign keys, ...) let them drift. The command below adds any counter column
+missing from the database and recounts every counter from scratch:
+
+    flask --app server aggregates
+
+Materialized lists need no rebuild here, each process rebuilds its own every ttl seconds.
+'''
+import click
+from flask_app import app, db
+from flask_app.config.cache import invalidate
+from flask_app.config.mysqlconnection import connectToMySQL
+from flask_app.config.orm import Schema
+
+def counters():
+    '''
+    Returns (child class, belongs_to relationship) for every counter declared by a class.
+    '''
+    return [(model,rel) for model in list(Schema.models.values()) for rel in model.counters]
+
+def migrate():
+    '''
+    Adds the counter columns missing from the database.
+
+    Returns
+    -------
+        List of the ALTER TABLE statements that were run.
+    '''
+    ran = []
+    for model,rel in counters():
+        parent = Schema.models[rel.model]
+        found = connectToMySQL(db).query_db(
+            "SELECT COLUMN_NAME AS col FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%(db)s AND TABLE_NAME=%(table)s AND COLUMN_NAME=%(col)s",
+            {"db" : db,"table" : parent.table,"col" : rel.counter}
+        )
+        if found is False or found:
+            continue
+        ddl = f"ALTER TABLE `{parent.table}` ADD COLUMN `{rel.counter}` INT NOT NULL DEFAULT 0"
+        if connectToMySQL(db).query_db(ddl) is False:
+            raise RuntimeError(f"Failed to add {parent.table}.{rel.counter}")
+        ran.append(ddl)
+    return ran
+
+def rebuild():
+    '''
+    Recounts every counter from the rows pointing at each parent.
+
+    Returns
+    -------
+        Dictionary of table.column -> number of rows whose counter had drifted, or False if the recount failed.
+    '''
+    fixed = {}
+    for model,rel in counters():
+        parent = Schema.models[rel.model]
+        keep = ", `updated_at` = `updated_at`" if "updated_at" in parent.columns else ''#a recount is not an update of the parent
+        query = f"UPDATE `{parent.table}` SET `{rel.counter}` = (SELECT COUNT(*) FROM `{model.table}` WHERE `{model.table}`.`{rel.key}` = `{parent.table}`.`id`){keep}"
+        results = connectToMySQL(db).transact_db([(query,None)])
+        invalidate(parent.table)
+        fixed[f"{parent.table}.{rel.counter}"] = False if results is False else results[0][1]
+    return fixed
+
+@app.cli.command("aggregates")
+def aggregates_command():
+    '''
+    Adds any missing counter columns and recounts every counter.
+    '''
+    for ddl in migrate():
+        click.echo(ddl)
+    for counter,count in rebuild().items():
+        click.echo(f"{counter}: {'failed' if count is False else f'{count} row(s) fixed'}")
@@ -0,0 +1,185 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+caches = []#every QueryCache created, so writes can invalidate all of them
+
+def sizeof(rows):
+    '''
+    Rough estimate of the memory held by a list of row dictionaries (or other values), in bytes.
+    '''
+    return sys.getsizeof(rows)+sum(sys.getsizeof(row)+(sum(sys.getsizeof(val) for val in row.values()) if isinstance(row,dict) else 0) for row in rows)
+
+class QueryCache:
+    def __init__(self, ttl=30, maxsize=10_000, maxbytes=None):
+        '''
+        A process-wide, thread-safe LRU cache of query results that expire after a time to live.
+
+        Entries are tagged with the tables they were read from so that any write to
+        one of those tables drops them (see invalidate).
+
+        Attributes:
+        ----------
+            ttl (float): Seconds a cached result stays valid.
+
+            maxsize (int): Maximum number of cached results.
+
+            maxbytes (int): Optional upper bound on the estimated memory held by cached rows.
+        '''
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()#key -> (expires, rows, size, tables)
+        self._tables = {}#table -> keys of entries read from it
+        self._generations = {}#table -> number of times it was invalidated
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        caches.append(self)
+
+    def generation(self, *tables):
+        '''
+        Returns a token that changes whenever any of the given tables is invalidated.
+
+        Pass it back to set so results read before a concurrent write are not stored.
+        '''
+        with self._lock:
+            return tuple(self._generations.get(table,0) for table in tables)
+
+    def get(self, key):
+        '''
+        Returns the cached rows for key or None if they are missing or expired.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, rows, tables, generation=None):
+        '''
+        Caches rows under key, evicting the least recently used entries to stay within maxsize and maxbytes.
+
+        Parameters
+        ----------
+            key (tuple): Hashable key identifying the query and its parameters.
+
+            rows (list): Rows returned by the query.
+
+            tables (tuple): Tables the rows were read from.
+
+            generation (tuple): Token returned by generation before running the query, if any.
+        '''
+        rows = tuple(rows)
+        size = sizeof(rows)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            if generation is not None and generation != tuple(self._generations.get(table,0) for table in tables):
+                return#a write happened while the query was running
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic()+self.ttl,rows,size,tables)
+            self.bytes += size
+            for table in tables:
+                self._tables.setdefault(table,set()).add(key)
+            while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        expires,rows,size,tables = self._entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            self._tables.get(table,set()).discard(key)
+
+    def invalidate(self, table):
+        '''
+        Drops every cached result read from the given table.
+        '''
+        with self._lock:
+            self._generations[table] = self._generations.get(table,0)+1
+            for key in list(self._tables.pop(table,())):
+                if key in self._entries:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self.bytes = 0
+
+    def stats(self):
+        '''
+        Returns a snapshot of the cache's counters.
+
+        Returns
+        -------
+            Dictionary with the number of entries, estimated bytes, and hit, miss,
+            eviction, expiration and invalidation counters.
+        '''
+        with self._lock:
+            return {
+                "entries" : len(self._entries),
+                "bytes" : self.bytes,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "expirations" : self.expirations,
+                "invalidations" : self.invalidations
+            }
+
+def invalidate(*tables):
+    '''
+    Drops every cached result read from any of the given tables, in every cache.
+
+    Example usages:
+    --------------
+        ``invalidate("questions") -> called after any write to the questions table``
+    '''
+    for cache in caches:
+        for table in tables:
+            cache.invalidate(table)
+
+def cached(ttl=30, maxsize=10_000, maxbytes=None):
+    '''
+    Decorator used to cache the results of retrieve_all and retrieve_one for a class across requests.
+
+    Should be placed above the table decorator. Cached results are dropped whenever
+    create, update, delete or MtM.add/remove write to the table.
+
+    Example usages
+    --------------
+        \n::
+
+        @cached(ttl=30,maxsize=10_000)
+        @table
+        class User(Schema):
+            pass
+
+    Parameters
+    ----------
+        ttl (float): Seconds a cached result stays valid.
+
+        maxsize (int): Maximum number of cached results.
+
+        maxbytes (int): Optional upper bound on the estimated memory held by cached rows.
+    '''
+    def inner(cls):
+        setattr(cls,"cache",QueryCache(ttl,maxsize,maxbytes))
+        return cls
+    return inner
@@ -0,0 +1,169 @@
+'''
+Index advisor driven by the query shapes Schema actually builds.
+
+statements.py records the columns every SELECT/DELETE shape filters and sorts on.
+The advisor EXPLAINs one query of each shape, flags full table scans and works out
+which composite indexes are missing from the database, as ALTER TABLE statements
+that can be printed, saved as a migration or applied:
+
+    flask --app server indexes                     -> report and print the DDL
+    flask --app server indexes --output 001.sql    -> save the DDL as a migration
+    flask --app server indexes --apply             -> run the DDL against the database
+
+Shapes are only known once the queries were built, so the shapes seen by a running
+server can be kept in a file by setting INDEX_SHAPES_FILE and passed with --shapes.
+The shapes of has_many/has_one relationships are always included.
+'''
+import atexit
+import json
+import os
+import re
+from collections import namedtuple
+import click
+from flask_app import app, db
+from flask_app.config import statements
+from flask_app.config.mysqlconnection import connectToMySQL, fingerprint
+from flask_app.config.orm import Schema, has_many
+
+Plan = namedtuple("Plan",["table","query","rows"])
+Suggestion = namedtuple("Suggestion",["table","columns","ddl"])
+
+def save(path):
+    '''
+    Writes every recorded shape to path as JSON, along with the shapes already saved there.
+    '''
+    load(path)
+    with open(path,"w") as file:
+        json.dump([[table,eq,order,query,many] for (table,eq,order),(query,many) in statements.shapes.items()],file,indent=1)
+
+def load(path):
+    '''
+    Adds the shapes saved in path, if it exists, to the recorded shapes.
+    '''
+    if not os.path.exists(path):
+        return
+    with open(path) as file:
+        for table,eq,order,query,many in json.load(file):
+            statements.shapes.setdefault((table,tuple(eq),tuple(order)),(query,tuple(many)))
+
+def observe_relationships():
+    '''
+    Builds the statement of every has_many/has_one relationship so its shape is recorded even if it was never queried.
+    '''
+    for model in list(Schema.models.values()):
+        for rel in vars(model).values():
+            if isinstance(rel,has_many):
+                statements.select(Schema.models[rel.model].table,None,statements.shape({rel.key : 0,**rel.filters}))
+
+def candidate(eq, order):
+    '''
+    Columns of the index serving a shape: the columns matched by equality, then the sorted ones.
+
+    Returns None for primary key lookups. id is dropped from the end since InnoDB secondary indexes already end with the primary key.
+    '''
+    if "id" in eq:
+        return None
+    columns = list(dict.fromkeys((*eq,*order)))
+    while columns and columns[-1] == "id":
+        columns.pop()
+    return (tuple(columns),len(set(eq))) if columns else None
+
+def covers(index, columns, equal):
+    '''
+    Whether an index can serve a lookup on columns, of which the first equal are matched by equality and so may come in any order.
+    '''
+    return len(index) >= len(columns) and set(index[:equal]) == set(columns[:equal]) and index[equal:len(columns)] == columns[equal:]
+
+def existing(table):
+    '''
+    Returns the columns of every index on the given table, in index order.
+    '''
+    rows = connectToMySQL(db).query_db(
+        "SELECT INDEX_NAME AS name, COLUMN_NAME AS col FROM information_schema.STATISTICS WHERE TABLE_SCHEMA=%(db)s AND TABLE_NAME=%(table)s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        {"db" : db,"table" : table}
+    ) or []
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row["name"],[]).append(row["col"])
+    return [tuple(columns) for columns in indexes.values()]
+
+def explain():
+    '''
+    EXPLAINs one query of every recorded shape, with 0 standing in for every parameter but _limit,
+    which is 1: MySQL answers LIMIT 0 with "Zero limit" and no plan for the tables.
+
+    Returns
+    -------
+        List of Plans, each holding the rows returned by EXPLAIN.
+    '''
+    plans = []
+    for (table,eq,order),(query,many) in statements.shapes.items():
+        params = {name : (0,) if name in many else 0 for name in re.findall(r"%\((\w+)\)s",query)}
+        if "_limit" in params:
+            params["_limit"] = 1
+        plans.append(Plan(table,query,connectToMySQL(db).query_db("EXPLAIN "+query,params) or []))
+    return plans
+
+def suggest():
+    '''
+    Works out the indexes missing for the recorded shapes.
+
+    Candidates covered by an existing index, or by a longer candidate on the same table, are left out.
+    Classes declaring fulltext columns get a FULLTEXT index on them if they have none.
+
+    Returns
+    -------
+        List of Suggestions, each with the ALTER TABLE statement adding the index.
+    '''
+    candidates = {}
+    for table,eq,order in statements.shapes:
+        found = candidate(eq,order)
+        if found:
+            candidates.setdefault(table,set()).add(found)
+    suggestions = []
+    for table,found in candidates.items():
+        indexes = existing(table)
+        for columns,equal in sorted(found,key=lambda item : -len(item[0])):
+            if any(covers(index,columns,equal) for index in indexes):
+                continue
+            indexes.append(columns)
+            name = f"idx_{table}_{'_'.join(columns)}"[:64]
+            suggestions.append(Suggestion(table,columns,f"ALTER TABLE `{table}` ADD INDEX `{name}` ({', '.join(f'`{col}`' for col in columns)});"))
+    for model in list(Schema.models.values()):
+        if model.fulltext and not any(set(index) == set(model.fulltext) for index in existing(model.table)):
+            name = f"ft_{model.table}_{'_'.join(model.fulltext)}"[:64]
+            suggestions.append(Suggestion(model.table,model.fulltext,f"ALTER TABLE `{model.table}` ADD FULLTEXT INDEX `{name}` ({', '.join(f'`{col}`' for col in model.fulltext)});"))
+    return suggestions
+
+if os.environ.get("INDEX_SHAPES_FILE"):
+    atexit.register(save,os.environ["INDEX_SHAPES_FILE"])
+
+@app.cli.command("indexes")
+@click.option("--shapes",type=click.Path(),help="File of shapes saved by a server run with INDEX_SHAPES_FILE.")
+@click.option("--output",type=click.Path(),help="Write the DDL to this migration file.")
+@click.option("--apply",is_flag=True,help="Run the DDL against the database.")
+def indexes_command(shapes, output, apply):
+    '''
+    Reports full table scans among the ORM's queries and the indexes that would avoid them.
+    '''
+    if shapes:
+        load(shapes)
+    observe_relationships()
+    for plan in explain():
+        for row in plan.rows:
+            flag = "FULL SCAN" if row.get("type") == "ALL" else "ok"
+            click.echo(f"{flag:<10}{row.get('table')} type={row.get('type')} key={row.get('key')} rows={row.get('rows')}  {fingerprint(plan.query)}")
+    suggestions = suggest()
+    if not suggestions:
+        click.echo("No missing indexes.")
+        return
+    ddl = "\n".join(suggestion.ddl for suggestion in suggestions)
+    click.echo(ddl)
+    if output:
+        with open(output,"w") as file:
+            file.write(ddl+"\n")
+    if apply:
+        for suggestion in suggestions:
+            if connectToMySQL(db).query_db(suggestion.ddl) is False:
+                raise click.ClickException(f"Failed to apply: {suggestion.ddl}")
+        click.echo(f"Applied {len(suggestions)} index(es).")
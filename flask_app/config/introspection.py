@@ -0,0 +1,170 @@
+'''
+Introspection of the live schema, so classes are checked against the tables they map.
+
+The columns of every table are read from INFORMATION_SCHEMA and kept in an on-disk cache
+(SCHEMA_CACHE_FILE, or schema.json in the app's instance folder) along with a checksum of them.
+Each process asks the database for the checksum alone, a single row, and only reads the columns
+again when it no longer matches the cache, so added, dropped and renamed columns are all noticed.
+SchemaMismatch is raised for a class declaring a column its table lacks. The check runs the
+first time the ORM builds an instance of the class:
+
+    flask --app server schema    -> check every class against the live schema and refresh the cache
+
+If the database cannot be read the cache is trusted as it is, and without either classes are
+used as declared, unchecked.
+'''
+import json
+import logging
+import os
+import threading
+import click
+from flask_app import app, db
+from flask_app.config.mysqlconnection import connectToMySQL
+
+logger = logging.getLogger(__name__)
+
+class SchemaMismatch(Exception):
+    '''
+    Raised when a class declares columns its table does not have.
+    '''
+
+lock = threading.Lock()
+schema = None#table -> column -> {"type", "nullable"}, in ordinal order
+read = False#whether reading the schema was attempted, it is not retried if neither the database nor a cache answered
+checked = set()#classes validated against the schema
+
+def path():
+    return os.environ.get("SCHEMA_CACHE_FILE") or os.path.join(app.instance_path,"schema.json")
+
+CHECKSUM = ("SELECT COUNT(*) AS `columns`, COALESCE(SUM(CRC32(CONCAT_WS(',',TABLE_NAME,COLUMN_NAME,ORDINAL_POSITION,DATA_TYPE,IS_NULLABLE))),0) AS `sum` "
+            "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %(db)s")
+
+def checksum():
+    '''
+    Returns a checksum of the database's columns, computed by the database, or None if it could not be read.
+    '''
+    try:
+        rows = connectToMySQL(db).query_db(CHECKSUM,{"db" : db})
+    except Exception as e:#no server to connect to
+        logger.warning("Could not read the schema of %s: %s",db,e)
+        return None
+    return f"{rows[0]['columns']}:{rows[0]['sum']}" if rows else None
+
+def fetch():
+    '''
+    Reads the columns of every table of the database from INFORMATION_SCHEMA.
+
+    Returns
+    -------
+        Dictionary of table -> column -> {"type", "nullable"} in ordinal order, or None if the database could not be read.
+    '''
+    try:
+        rows = connectToMySQL(db).query_db(
+            "SELECT TABLE_NAME AS `table`, COLUMN_NAME AS `column`, DATA_TYPE AS `type`, IS_NULLABLE AS nullable "
+            "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %(db)s ORDER BY TABLE_NAME, ORDINAL_POSITION",{"db" : db})
+    except Exception as e:#no server to connect to
+        logger.warning("Could not read the schema of %s: %s",db,e)
+        return None
+    if not rows:
+        return None
+    tables = {}
+    for row in rows:
+        tables.setdefault(row["table"],{})[row["column"]] = {"type" : row["type"],"nullable" : row["nullable"] == "YES"}
+    return tables
+
+def load():
+    '''
+    Returns the schema kept in the on-disk cache and its checksum, or None if there is none for this database.
+    '''
+    try:
+        with open(path()) as file:
+            found = json.load(file)
+    except (OSError,ValueError):
+        return None
+    return (found["tables"],found.get("checksum")) if found.get("db") == db else None
+
+def save(tables, checksum):
+    try:
+        os.makedirs(os.path.dirname(path()),exist_ok=True)
+        with open(path(),"w") as file:
+            json.dump({"db" : db,"checksum" : checksum,"tables" : tables},file,indent=1)
+    except OSError as e:#the cache only saves a query on the next start
+        logger.warning("Could not write the schema cache %s: %s",path(),e)
+
+def current(refresh=False):
+    '''
+    Returns the schema, read once per process (or again with refresh).
+
+    Comes from the on-disk cache if the database's checksum matches it, or if the database cannot
+    be read at all. Otherwise the columns are read from the database and cached. None if neither could be read.
+    '''
+    global schema, read
+    with lock:
+        if refresh or not read:
+            live = checksum()
+            cached = load()
+            if cached is not None and (live is None or live == cached[1]) and not refresh:
+                found = cached[0]
+            else:
+                found = fetch() if live is not None else None
+                if found is not None:
+                    save(found,live)
+                elif cached is not None:#the database went away in between
+                    found = cached[0]
+            schema = found if found is not None else schema
+            read = True
+        return schema
+
+def problems(model, tables):
+    '''
+    Returns the ways a class disagrees with the schema, an empty list if it does not.
+    '''
+    columns = tables.get(model.table)
+    if columns is None:
+        return [f"table {model.table} does not exist"]
+    return [f"column {model.table}.{col} does not exist" for col in model.columns if col not in columns]
+
+def check(model):
+    '''
+    Validates a class against the schema, once per class.
+
+    Example usages:
+    --------------
+        ``check(Question) -> ("id", "question", "description", ...)``
+
+    Returns
+    -------
+        Columns of the class's table in ordinal order, or None if no schema could be read.
+
+    Raises
+    ------
+        SchemaMismatch if the class declares columns its table does not have.
+    '''
+    tables = current()
+    if tables is None:
+        return None
+    if model not in checked:
+        found = problems(model,tables)
+        if found:
+            raise SchemaMismatch(f"{model.__name__} does not match the database {db}: {'; '.join(found)}")
+        checked.add(model)
+    return tuple(tables[model.table])
+
+@app.cli.command("schema")
+def schema_command():
+    '''
+    Checks every class against the live schema and refreshes the on-disk cache.
+    '''
+    from flask_app.config.orm import Schema
+    tables = current(refresh=True)
+    if tables is None:
+        raise click.ClickException(f"Could not read the schema of {db}")
+    failed = False
+    for model in Schema.models.values():
+        found = problems(model,tables)
+        failed = failed or bool(found)
+        extra = [col for col in tables.get(model.table,()) if col not in model.columns]
+        click.echo(f"{'MISMATCH' if found else 'ok':<10}{model.__name__} ({model.table})"+"".join(f"\n  {problem}" for problem in found)+(f"\n  not declared, ignored: {', '.join(extra)}" if extra else ""))
+    click.echo(f"Cached in {path()}.")
+    if failed:
+        raise SystemExit(1)
@@ -1,33 +1,707 @@
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
 import pymysql.cursors
 
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "host" : 'localhost',
+    "user" : 'root',
+    "password" : 'root',
+    "charset" : 'utf8mb4',
+    "cursorclass" : pymysql.cursors.DictCursor,
+    "autocommit" : True
+}
+
+class PoolTimeout(Exception):
+    '''
+    Raised when no connection could be checked out of a pool before the timeout ran out.
+    '''
+
+class ConnectionPool:
+    def __init__(self, db, size=10, timeout=30, recycle=3600, ping=True, connect=None, **options):
+        '''
+        A bounded, thread-safe pool of pymysql connections to a single database.
+
+        Connections are created lazily up to size and handed back out in
+        last-in-first-out order so that, when traffic drops, the surplus
+        connections sit untouched at the bottom of the pool and get recycled.
+
+        Example usages:
+        --------------
+            ``ConnectionPool("qa_db",size=5) -> pool of at most 5 connections to qa_db``
+
+            ``ConnectionPool("qa_db",recycle=600,host="db.internal") -> reopens connections older than 10 minutes``
+
+        Attributes:
+        ----------
+            db (str): Name of the database every connection is opened against.
+
+            size (int): Maximum number of connections open at the same time.
+
+            timeout (float): Seconds to wait for a free connection before raising PoolTimeout.
+
+            recycle (float): Seconds after which a connection is closed and reopened on checkout.
+
+            ping (bool): Whether to health-check idle connections on checkout.
+
+            connect (callable): Opens a connection from the options, pymysql.connect if None. Lets anything speaking pymysql's connection interface stand in for the server.
+
+            options (**str): Extra key word arguments passed on to pymysql.connect.
+
+            closed (bool): Whether close was called, connections released from then on are closed rather than kept.
+        '''
+        self.db = db
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping = ping
+        self.connect = connect or pymysql.connect
+        self.options = {**DEFAULTS, **options, "db" : db}
+        self._idle = deque()
+        self._born = {}
+        self._open = 0
+        self._lock = threading.Condition()
+        self.closed = False
+        self.checkouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_allowed_packet = None#read from the server on first use
+        self.auto_increment = None#(step, consecutive), read from the server on first use
+
+    def _connect(self):
+        conn = self.connect(**self.options)
+        self._born[conn] = time.monotonic()
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _close(self, conn):
+        self._born.pop(conn,None)
+        try:
+            conn.close()
+        except Exception:#already closed by the server
+            pass
+
+    def _reconnect(self, conn):
+        self._close(conn)
+        with self._lock:
+            self.recycled += 1
+        return self._connect()
+
+    def acquire(self):
+        '''
+        Checks a connection out of the pool, waiting for one to be released if the pool is exhausted.
+
+        Returns
+        -------
+            An open pymysql connection which must be handed back with release.
+        '''
+        start = time.monotonic()
+        with self._lock:
+            while not self._idle and self._open >= self.size:
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No connection to {self.db} available after {self.timeout}s")
+                self._lock.wait(remaining)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1
+            self.checkouts += 1
+            self.wait_time += time.monotonic() - start
+        try:
+            if conn is None:
+                return self._connect()
+            if time.monotonic() - self._born[conn] > self.recycle:
+                return self._reconnect(conn)
+            if self.ping:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:#connection went away while idle
+                    return self._reconnect(conn)
+            return conn
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        '''
+        Hands a connection back to the pool.
+
+        Parameters
+        ----------
+            conn (Connection): Connection previously returned by acquire.
+
+            discard (bool): Close the connection instead of reusing it, e.g. after a network error.
+        '''
+        if not discard and conn.open:
+            with self._lock:
+                if not self.closed:
+                    self._idle.append(conn)
+                    self._lock.notify()
+                    return
+        self._close(conn)#discarded, gone away, or the pool was replaced while it was checked out
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def close(self):
+        '''
+        Closes every idle connection. Connections currently checked out are closed when released.
+        '''
+        with self._lock:
+            self.closed = True
+            while self._idle:
+                self._close(self._idle.pop())
+                self._open -= 1
+
+    def stats(self):
+        '''
+        Returns a snapshot of the pool's counters.
+
+        Returns
+        -------
+            Dictionary with size, open, idle and in-use connection counts along with
+            checkout, creation, recycle and timeout counters and total/average wait time in seconds.
+        '''
+        with self._lock:
+            return {
+                "size" : self.size,
+                "open" : self._open,
+                "idle" : len(self._idle),
+                "in_use" : self._open - len(self._idle),
+                "checkouts" : self.checkouts,
+                "created" : self.created,
+                "recycled" : self.recycled,
+                "timeouts" : self.timeouts,
+                "wait_time" : self.wait_time,
+                "avg_wait_time" : self.wait_time / self.checkouts if self.checkouts else 0.0
+            }
+
+pools = {}
+replica_sets = {}#db -> Replicas serving reads for the primary in pools
+_pools_lock = threading.Lock()
+#----------------Instrumentation-----------------#
+class QueryEvent:
+    __slots__ = ("query","duration","rows","error")
+
+    def __init__(self, query, duration, rows, error):
+        self.query = query
+        self.duration = duration
+        self.rows = rows
+        self.error = error
+
+    @property
+    def fingerprint(self):#only normalized for the hooks that read it
+        return fingerprint(self.query)
+
+hooks = []#callables receiving a QueryEvent after every query
+slow_query_threshold = 0.5#seconds, queries slower than this are logged as warnings
+
+def on_query(func):
+    '''
+    Decorator used to register a function to be called with a QueryEvent after every query.
+
+    Hooks run on the thread that ran the query, so they should be quick and hand anything
+    slow (exporting, aggregating) off elsewhere.
+
+    Example usages
+    --------------
+        \n::
+
+        @on_query
+        def count(event):
+            stats[event.fingerprint] += event.duration
+
+    Attributes:
+    ----------
+        QueryEvent.fingerprint (str): Query with its parameters and value lists stripped, shared by every query of the same shape.
+
+        QueryEvent.query (str): Query as sent, before parameters were substituted.
+
+        QueryEvent.duration (float): Wall time of the query in seconds, excluding time spent waiting on the pool.
+
+        QueryEvent.rows (int): Rows returned by a SELECT or affected by a write, None if the query failed.
+
+        QueryEvent.error (Exception): Exception raised by the query, if any.
+    '''
+    hooks.append(func)
+    return func
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    '''
+    Normalizes a query so every execution of the same statement shape maps to the same string.
+
+    Placeholders and literal values become ?, runs of them (IN lists, multi-row VALUES) collapse into one, and whitespace is squeezed.
+    '''
+    query = re.sub(r"%\(\w+\)s|%s|'(?:[^'\\]|\\.)*'|\b\d+\b","?",query)
+    query = re.sub(r"\(\?(?:,\s*\?)*\)(?:,\s*\(\?(?:,\s*\?)*\))*","(?+)",query)
+    return re.sub(r"\s+"," ",query).strip()
+
+def record(query, duration, rows, error):
+    if duration >= slow_query_threshold:
+        logger.warning("Slow query (%.1f ms): %s",duration*1000,fingerprint(query))
+    if hooks:
+        event = QueryEvent(query,duration,rows,error)
+        for hook in hooks:
+            hook(event)
+#------------------------------------------------#
+
+class Replicas:
+    def __init__(self, pools, policy="round_robin", max_lag=None, sticky=5, lag_interval=5):
+        '''
+        The read replicas of a database, each with its own ConnectionPool, and the rules for picking one.
+
+        Replication lag is read from every replica every lag_interval seconds on a background thread.
+        Replicas whose lag is over max_lag, or which could not be checked, get no reads until they catch up.
+
+        Attributes:
+        ----------
+            pools (list): ConnectionPool of each replica.
+
+            policy (str): "round_robin" to take turns, "least_busy" for the replica with the fewest connections in use.
+
+            max_lag (float): Seconds of lag past which a replica is skipped, None to never skip one for lag.
+
+            sticky (float): Seconds after a write during which reads of the same session stay on the primary, see orm.reads_replicas.
+
+            lag_interval (float): Seconds between lag checks, None to never check.
+
+            lag (dict): Last lag measured for each pool, in seconds. None until checked, inf if it could not be.
+        '''
+        self.pools = pools
+        self.policy = policy
+        self.max_lag = max_lag
+        self.sticky = sticky
+        self.lag_interval = lag_interval
+        self.lag = {pool : None for pool in pools}
+        self._turn = itertools.count()
+        self._stopped = threading.Event()
+        if lag_interval:
+            threading.Thread(target=self._monitor,daemon=True).start()
+
+    def choose(self):
+        '''
+        Returns the pool of the replica to read from, or None if every replica is lagging or down.
+        '''
+        healthy = [pool for pool in self.pools if self.lag[pool] != float("inf") and (self.max_lag is None or (self.lag[pool] or 0) <= self.max_lag)]
+        if not healthy:
+            return None
+        if self.policy == "least_busy":
+            return min(healthy,key=lambda pool : pool._open-len(pool._idle))
+        return healthy[next(self._turn)%len(healthy)]
+
+    def check_lag(self):
+        '''
+        Reads the replication lag of every replica, from SHOW REPLICA STATUS or, on MariaDB and older MySQL, SHOW SLAVE STATUS.
+
+        Returns
+        -------
+            Dictionary of pool -> seconds behind the primary.
+        '''
+        for pool in self.pools:
+            try:
+                conn = pool.acquire()
+            except Exception as e:
+                logger.warning("Replica %s unreachable: %s",pool.options.get("host"),e)
+                self.lag[pool] = float("inf")
+                continue
+            discard = False
+            try:
+                with conn.cursor() as cursor:
+                    try:
+                        cursor.execute("SHOW REPLICA STATUS")
+                    except pymysql.err.ProgrammingError:#older than MySQL 8.0.22
+                        cursor.execute("SHOW SLAVE STATUS")
+                    status = cursor.fetchone()
+                lag = status and status.get("Seconds_Behind_Source",status.get("Seconds_Behind_Master"))
+                self.lag[pool] = float("inf") if status and lag is None else float(lag or 0)#NULL while replication is stopped
+            except Exception as e:
+                logger.warning("Could not read the lag of replica %s: %s",pool.options.get("host"),e)
+                self.lag[pool] = float("inf")
+                discard = isinstance(e,(pymysql.err.OperationalError,pymysql.err.InterfaceError))
+            finally:
+                pool.release(conn,discard)
+            if self.max_lag is not None and self.lag[pool] > self.max_lag:
+                logger.warning("Replica %s is %.0fs behind, skipping it",pool.options.get("host"),self.lag[pool])
+        return dict(self.lag)
+
+    def _monitor(self):
+        while not self._stopped.wait(self.lag_interval):
+            self.check_lag()
+
+    def close(self):
+        self._stopped.set()
+        for pool in self.pools:
+            pool.close()
+
+    def stats(self):
+        '''
+        Returns the lag and pool counters of every replica.
+
+        Returns
+        -------
+            List of dictionaries with the host, port and lag in seconds of each replica, along with its ConnectionPool.stats.
+        '''
+        return [{"host" : pool.options.get("host"),"port" : pool.options.get("port",3306),"lag" : self.lag[pool],**pool.stats()} for pool in self.pools]
+
+def configure_pool(db, replicas=(), policy="round_robin", max_lag=None, sticky=5, lag_interval=5, **options):
+    '''
+    Creates (or replaces) the connection pool used for the given database, and the pools of its read replicas if any.
+
+    Reads asked for with connectToMySQL(db,read=True) go to a replica, everything else goes to the primary.
+
+    Example usages:
+    --------------
+        ``configure_pool("qa_db",size=20,recycle=600)``
+
+        ``configure_pool("qa_db",host="db1",replicas=[{"host" : "db2"},{"host" : "db3"}]) -> reads go to db2 and db3 in turn``
+
+        ``configure_pool("qa_db",host="db1",replicas=[{"port" : 3307}],policy="least_busy",max_lag=10)``
+
+    Parameters
+    ----------
+        db (str): Name of the database.
+
+        replicas (list): Dictionaries of the options of each replica, added to (and overriding) the primary's.
+
+        policy (str): How replicas are picked, see Replicas.
+
+        max_lag (float): Seconds of lag past which a replica is skipped, see Replicas.
+
+        sticky (float): Seconds after a write during which reads of the same session stay on the primary.
+
+        lag_interval (float): Seconds between replication lag checks.
+
+        options (**str): Key word arguments passed on to ConnectionPool.
+
+    Returns
+    -------
+        The new ConnectionPool of the primary.
+    '''
+    with _pools_lock:
+        old = pools.get(db)
+        old_replicas = replica_sets.pop(db,None)
+        pools[db] = ConnectionPool(db,**options)
+        if replicas:
+            replica_sets[db] = Replicas([ConnectionPool(db,**{**options,**replica}) for replica in replicas],policy,max_lag,sticky,lag_interval)
+    if old:
+        old.close()
+    if old_replicas:
+        old_replicas.close()
+    return pools[db]
+
+def get_pool(db):
+    '''
+    Returns the pool for the given database, creating one with default settings if none was configured.
+    '''
+    pool = pools.get(db)
+    if pool is None:
+        with _pools_lock:
+            pool = pools.setdefault(db,ConnectionPool(db))
+    return pool
+
 class MySQLConnection:
-    def __init__(self, db):
-        self.connection = pymysql.connect(
-            host = 'localhost',
-            user = 'root',
-            password = 'root', 
-            db = db,
-            charset = 'utf8mb4',
-            cursorclass = pymysql.cursors.DictCursor,
-            autocommit = True
-        )
-
-    def query_db(self, query, data=None):
-        with self.connection.cursor() as cursor:
+    def __init__(self, db, read=False):
+        self.primary = self.pool = get_pool(db)
+        if read and db in replica_sets and self._transaction() is None:#a transaction reads its own writes
+            self.pool = replica_sets[db].choose() or self.primary
+
+    def _acquire(self):
+        if self.pool is not self.primary:
             try:
-                query = cursor.mogrify(query, data)
-                print("Running Query:", query)
-                cursor.execute(query)
-                if query.lower().startswith("select"):
+                return self.pool.acquire()
+            except Exception as e:#replica down, the primary can answer
+                logger.warning("Replica %s unavailable, reading from the primary: %s",self.pool.options.get("host"),e)
+                self.pool = self.primary
+        return self.pool.acquire()
+
+    def _transaction(self):
+        transaction = current.get()
+        return transaction if transaction is not None and transaction.pool is self.primary else None
+
+    def _execute(self, cursor, query, data):
+        '''
+        Runs one statement on a cursor and records it, letting any error through.
+        '''
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Running Query: %s",cursor.mogrify(query, data))
+        start = time.perf_counter()
+        try:
+            cursor.execute(query, data)
+        except Exception as e:
+            record(query,time.perf_counter()-start,None,e)
+            raise
+        record(query,time.perf_counter()-start,cursor.rowcount,None)
+
+    def transaction(self):
+        '''
+        Returns a Transaction on a connection of the database's pool, to use as a with block.
+        '''
+        return Transaction(self.primary)
+
+    def query_db(self, query, data=None, tuples=False):
+        transaction = self._transaction()
+        cursorclass = pymysql.cursors.Cursor if tuples else None#rows as tuples of values rather than dictionaries
+        if transaction is not None:#runs on the transaction's connection, committed with it, errors raised
+            with transaction.lock, transaction.connection.cursor(cursorclass) as cursor:
+                self._execute(cursor,query,data)
+                if query.lower().startswith(("select","explain","show")):
                     return cursor.fetchall()
-                self.connection.commit()
                 if query.lower().startswith("insert"):
                     return cursor.lastrowid
-            except Exception as e:
-                print("Something went wrong", e)
-                return False
-            finally:
-                self.connection.close()
+                return None
+        connection = self._acquire()
+        discard = False
+        rows = error = None
+        start = time.perf_counter()
+        try:
+            with connection.cursor(cursorclass) as cursor:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Running Query: %s",cursor.mogrify(query, data))
+                cursor.execute(query, data)
+                if query.lower().startswith(("select","explain","show")):
+                    result = cursor.fetchall()
+                    rows = len(result)
+                    return result
+                rows = cursor.rowcount
+                connection.commit()
+                if query.lower().startswith("insert"):
+                    return cursor.lastrowid
+        except Exception as e:
+            logger.error("Query failed: %s (%s)",fingerprint(query),e)
+            error = e
+            discard = isinstance(e,(pymysql.err.OperationalError,pymysql.err.InterfaceError))
+            return False
+        finally:
+            self.pool.release(connection,discard)
+            record(query,time.perf_counter()-start,rows,error)
+
+    def transact_db(self, statements):
+        '''
+        Runs several statements on one connection inside a single transaction.
+
+        Either every statement is committed or, if any of them fails, none are.
+
+        Example usages:
+        --------------
+            ``connectToMySQL(db).transact_db([("DELETE FROM answers WHERE id IN %s",[(1,2)]),...])``
+
+        Parameters
+        ----------
+            statements (list): Pairs of query and parameters to run in order.
+
+        Returns
+        -------
+            List of (lastrowid, rowcount) pairs, one for each statement, or False if the transaction failed.
+        '''
+        transaction = self._transaction()
+        if transaction is not None:#part of the enclosing transaction
+            results = []
+            with transaction.lock, transaction.connection.cursor() as cursor:
+                for query, data in statements:
+                    self._execute(cursor,query,data)
+                    results.append((cursor.lastrowid,cursor.rowcount))
+            return results
+        connection = self.pool.acquire()
+        discard = False
+        results = []
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                for query, data in statements:
+                    self._execute(cursor,query,data)
+                    results.append((cursor.lastrowid,cursor.rowcount))
+            connection.commit()
+            return results
+        except Exception as e:
+            logger.error("Transaction failed: %s",e)
+            discard = isinstance(e,(pymysql.err.OperationalError,pymysql.err.InterfaceError))
+            if not discard:
+                connection.rollback()
+            return False
+        finally:
+            self.pool.release(connection,discard)
+
+    def packet_size(self):
+        '''
+        Returns the server's max_allowed_packet in bytes, the largest statement it accepts. Read once per pool.
+        '''
+        if self.pool.max_allowed_packet is None:
+            result = self.query_db("SELECT @@max_allowed_packet AS size")
+            self.pool.max_allowed_packet = result[0]["size"] if result else 4*1024*1024
+        return self.pool.max_allowed_packet
+
+    def auto_increment(self):
+        '''
+        Returns the server's auto_increment_increment and whether a multi-row insert is sure to get
+        ids that follow each other by it, which only the traditional and consecutive lock modes
+        promise (innodb_autoinc_lock_mode 0 or 1). Read once per pool, assumed not if it cannot be read.
+        '''
+        if self.pool.auto_increment is None:
+            result = self.query_db("SELECT @@auto_increment_increment AS step, @@innodb_autoinc_lock_mode AS mode")
+            self.pool.auto_increment = (int(result[0]["step"]),int(result[0]["mode"]) in (0,1)) if result else (1,False)
+        return self.pool.auto_increment
+
+    def stream_db(self, query, data=None, batch_size=1000, tuples=False):
+        '''
+        Runs a SELECT query on an unbuffered server-side cursor and yields its rows as they arrive.
+
+        At most batch_size rows are held in memory at a time. The connection stays checked out
+        until the generator is exhausted or closed; a generator closed early discards its
+        connection rather than reading the rest of the result off the wire.
+
+        Example usages:
+        --------------
+            ``for row in connectToMySQL(db).stream_db("SELECT * FROM answers"): ...``
+
+        Parameters
+        ----------
+            query (str): SELECT query to run.
+
+            data (dict): Parameters for the query.
+
+            batch_size (int): Number of rows fetched from the server at a time.
+
+            tuples (bool): Yield each row as a tuple of values in the order of the selected columns rather than a dictionary.
+        '''
+        if self._transaction() is not None:#an unbuffered cursor would hold up the transaction's connection
+            yield from self.query_db(query, data, tuples)
+            return
+        connection = self._acquire()
+        cursor = connection.cursor(pymysql.cursors.SSCursor if tuples else pymysql.cursors.SSDictCursor)
+        done = False
+        rows = error = None
+        start = time.perf_counter()
+        try:
+            cursor.execute(query, data)
+            rows = 0
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows += len(batch)
+                yield from batch
+            done = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if done:
+                cursor.close()
+            self.pool.release(connection,not done)
+            record(query,time.perf_counter()-start,rows,error)#includes time spent by the consumer
+
+#------------------Transactions------------------#
+DEADLOCK_ERRORS = (1213,1205)#ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+current = ContextVar("transaction",default=None)
+
+class Transaction:
+    def __init__(self, pool):
+        '''
+        A transaction on one connection checked out of a pool, used as a with block.
+
+        While the block runs, every query MySQLConnection sends to the same database goes to this
+        connection and nothing is committed until the block exits: all of it is committed at once,
+        or rolled back if the block raised. Failing queries raise instead of returning False so the
+        block cannot carry on past them. A with block nested in another on the same database joins it.
+
+        Example usages:
+        --------------
+            \n::
+
+            with connectToMySQL(db).transaction():
+                connectToMySQL(db).query_db("SELECT * FROM questions WHERE id=%(id)s FOR UPDATE",{"id" : 1})
+                connectToMySQL(db).query_db("UPDATE questions SET answered=1 WHERE id=%(id)s",{"id" : 1})
+
+        Attributes:
+        ----------
+            pool (ConnectionPool): Pool the connection is checked out of.
+
+            callbacks (list): Functions and arguments to call once the transaction is committed, see after_commit.
+        '''
+        self.pool = pool
+        self.connection = None
+        self.callbacks = []
+        self.lock = threading.Lock()#async calls copy the context into other threads, one statement at a time
+        self._outer = None
+        self._token = None
+
+    def __enter__(self):
+        outer = current.get()
+        if outer is not None and outer.pool is self.pool:
+            self._outer = outer
+            return outer
+        self.connection = self.pool.acquire()
+        try:
+            self.connection.begin()
+        except Exception:
+            self.pool.release(self.connection,True)
+            raise
+        self._token = current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._outer is not None:#the outer block commits
+            return False
+        current.reset(self._token)
+        try:
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        except Exception:#connection is in an unknown state, the server rolls back when it closes
+            self.pool.release(self.connection,True)
+            if exc_type is None:
+                raise
+            return False
+        self.pool.release(self.connection)
+        if exc_type is None:
+            for func,args in self.callbacks:
+                func(*args)
+        return False
+
+def after_commit(func, *args):
+    '''
+    Calls func with args once the current transaction is committed, or right away outside of one.
+
+    Dropped if the transaction rolls back, so caches and in-memory state only ever see committed writes.
+    '''
+    transaction = current.get()
+    if transaction is None:
+        func(*args)
+    else:
+        transaction.callbacks.append((func,args))
+
+def in_transaction(db):
+    '''
+    Whether queries to the given database currently run inside a transaction.
+    '''
+    transaction = current.get()
+    return transaction is not None and transaction.pool is pools.get(db)
+
+def is_deadlock(e):
+    '''
+    Whether an exception is a deadlock or lock wait timeout, after which the transaction can be run again from the start.
+    '''
+    return isinstance(e,pymysql.err.OperationalError) and bool(e.args) and e.args[0] in DEADLOCK_ERRORS
+#------------------------------------------------#
 
-def connectToMySQL(db):
-    return MySQLConnection(db)
\ No newline at end of file
+def connectToMySQL(db, read=False):
+    '''
+    Returns a connection to the given database, to one of its replicas if read and it has any (see configure_pool).
+    '''
+    return MySQLConnection(db,read)
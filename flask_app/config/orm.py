@@ -1,6 +1,744 @@
-from flask import flash
-from flask_app.config.mysqlconnection import connectToMySQL
-from flask_app import db
+import asyncio
+import base64
+import inspect
+import json
+import keyword
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from functools import lru_cache, partial, update_wrapper, wraps
+from contextvars import ContextVar
+from flask import flash, g, has_app_context, has_request_context, session
+from flask_app.config.mysqlconnection import after_commit, connectToMySQL, in_transaction, is_deadlock, on_query, replica_sets
+from flask_app.config.cache import invalidate
+from flask_app.config.introspection import check
+from flask_app.config import statements
+from flask_app import app, db
+
+logger = logging.getLogger(__name__)
+
+def identity_map():
+    '''
+    Returns the identity map of the current request, a dictionary of instances keyed by table and then id.
+
+    Outside of a request there is no identity map and None is returned, so an app context kept
+    open by a CLI command or a worker does not hold on to every instance it ever loaded.
+    '''
+    if not has_request_context():
+        return None
+    return g.setdefault("identity_map",{})
+
+@app.teardown_request
+def clear_identity_map(exc):
+    g.pop("identity_map",None)
+
+query_count_lock = threading.Lock()#the queries of one request can run on several threads, see the async methods
+
+@on_query
+def count_query(event):#per-request totals reported by add_query_summary
+    if has_app_context():
+        with query_count_lock:
+            g.query_count = g.get("query_count",0)+1
+            g.query_time = g.get("query_time",0.0)+event.duration
+
+wrote_at = ContextVar("wrote_at",default=0.0)#time of the last write made outside of a request
+
+def mark_write():
+    '''
+    Records that the current request (and its session) or, outside a request, the current context just wrote to the database.
+    '''
+    if db not in replica_sets:
+        return
+    now = time.time()
+    if has_request_context():
+        g.wrote_at = session["_wrote_at"] = now#the session carries it over the redirect that usually follows a write
+    else:
+        wrote_at.set(now)
+
+def reads_replicas():
+    '''
+    Whether reads may go to a replica: not within the sticky window after a write of the same
+    request or session (or context outside of requests), so everyone reads their own writes.
+    '''
+    replicas = replica_sets.get(db)
+    if replicas is None:
+        return False
+    last = wrote_at.get()
+    if has_request_context():
+        last = max(last,g.get("wrote_at",0.0),session.get("_wrote_at",0.0))
+    return time.time()-last > replicas.sticky
+
+def reader():#connection for the ORM's reads
+    return connectToMySQL(db,reads_replicas())
+
+@app.after_request
+def add_query_summary(response):
+    response.headers["Server-Timing"] = f'db;dur={g.get("query_time",0.0)*1000:.2f};desc="{g.get("query_count",0)} queries"'
+    return response
+
+class Collection(list):
+    '''
+    List of class instances returned by Schema.retrieve_all.
+
+    Behaves exactly like a list but can eagerly load relationships for every item at once.
+    '''
+    def with_related(self, *names):
+        '''
+        Loads the given relationships for every item in the collection using one query per relationship.
+
+        Example usages:
+        --------------
+            ``Question.retrieve_all().with_related("asker") -> every question.asker is loaded in a single query``
+
+            ``Answer.retrieve_all(question_id=1).with_related("answerer","question")``
+
+        Parameters
+        ----------
+            names (*str): Names of belongs_to relationships declared on the class of the items.
+
+        Returns
+        -------
+            The same collection, to allow chaining.
+        '''
+        if self:
+            for name in names:
+                getattr(type(self[0]),name).load(self)
+        return self
+
+    def join(self, *paths):
+        '''
+        Loads the given relationships, and the relationships of those, for every item in the collection.
+
+        Each relationship costs one query no matter how many items there are, with the belongs_to
+        relationships further down a path JOINed into that same query. has_many and has_one
+        relationships to the same table through the same key share a single query.
+
+        Example usages:
+        --------------
+            ``questions.join("asker") -> same as with_related("asker")``
+
+            ``questions.join("answers.answerer","selected_answer.answerer") -> one query for every answer and its answerer``
+
+        Parameters
+        ----------
+            paths (*str): Relationship names, with the relationships of the related class after a dot.
+
+        Returns
+        -------
+            The same collection, to allow chaining.
+        '''
+        load_tree(self,parse_paths(paths))
+        return self
+
+    async def awith_related(self, *names):
+        '''
+        Async counterpart of with_related, loading each of the given relationships concurrently.
+
+        Example usages:
+        --------------
+            ``await questions.awith_related("asker")``
+        '''
+        if self:
+            await asyncio.gather(*(asyncio.to_thread(getattr(type(self[0]),name).load,self) for name in names))
+        return self
+
+def parse_paths(paths):
+    '''
+    Turns dotted relationship paths into a tree: ("answers.answerer","asker") -> {"answers" : {"answerer" : {}}, "asker" : {}}
+    '''
+    tree = {}
+    for path in paths:
+        node = tree
+        for name in path.split("."):
+            node = node.setdefault(name,{})
+    return tree
+
+def flatten_paths(tree, prefix=""):
+    '''
+    Turns a tree of relationships back into dotted paths, the reverse of parse_paths.
+    '''
+    return tuple(path for name,subtree in tree.items() for path in (flatten_paths(subtree,f"{prefix}{name}.") or (f"{prefix}{name}",)))
+
+def load_tree(items, tree):
+    '''
+    Loads a tree of relationships for every given instance, with one query per relationship (or group of relationships to the same table).
+    '''
+    if not items:
+        return
+    owner = type(items[0])
+    groups = {}
+    for name,subtree in tree.items():
+        rel = getattr(owner,name)
+        if isinstance(rel,belongs_to):
+            model = Schema.models[rel.model]
+            ids = tuple({getattr(item,rel.attr) for item in items} - {None})
+            found = {inst.id : inst for inst in model.retrieve_all(columns=rel.columns,join=flatten_paths(subtree),id=ids)} if ids else {}
+            for item in items:
+                item._related[name] = found.get(getattr(item,rel.attr))
+        else:
+            groups.setdefault((rel.model,rel.key),[]).append((name,rel,subtree))
+    ids = tuple({item.id for item in items})
+    for (model,key),group in groups.items():
+        model = Schema.models[model]
+        common = {col : val for col,val in group[0][1].filters.items() if all(col in rel.filters and rel.filters[col] == val for name,rel,subtree in group)}
+        merged = parse_paths(path for name,rel,subtree in group for path in flatten_paths(subtree))
+        buckets = {name : {} for name,rel,subtree in group}
+        for inst in model.retrieve_all(join=flatten_paths(merged),**{key : ids},**common):
+            for name,rel,subtree in group:
+                if all(getattr(inst,model.attrs.get(col,col)) == val for col,val in rel.filters.items()):
+                    buckets[name].setdefault(getattr(inst,model.attrs.get(key,key)),[]).append(inst)
+        for item in items:
+            for name,rel,subtree in group:
+                found = buckets[name].get(item.id,[])
+                item._related[name] = (found[0] if found else None) if isinstance(rel,has_one) else Collection(found)
+
+class Join:
+    def __init__(self, model, tree, columns=None):
+        '''
+        Plan for a single SELECT of a table (aliased t0) with the belongs_to relationships in tree LEFT JOINed in.
+
+        Every column is selected as alias__column so rows can be split back into one dictionary
+        per table. has_many/has_one relationships would multiply the rows if JOINed, so they are
+        kept in rest and loaded with load_tree once the rows are built.
+
+        Attributes:
+        ----------
+            model (Schema): Class of the table the rows are selected from.
+
+            tree (dict): Relationships to load, as returned by parse_paths.
+
+            columns (tuple): Columns to load for the t0 table, every declared column if None.
+        '''
+        self.alias = "t0"
+        self.nodes = []#(alias, class, columns, parent alias, relationship)
+        self.joins = []
+        self.rest = {}#alias -> tree of relationships to load afterwards
+        self.add(model,tree,None,None,columns)
+        self.columns = ', '.join(f"{alias}.`{col}` AS `{alias}__{col}`" for alias,model,columns,parent,rel in self.nodes for col in columns)
+        self.source = ' '.join([f"`{model.table}` AS t0",*self.joins])
+        self.tables = tuple(dict.fromkeys(node[1].table for node in self.nodes))
+
+    def add(self, model, tree, parent, rel, columns):
+        alias = f"t{len(self.nodes)}"
+        self.nodes.append((alias,model,tuple(dict.fromkeys(("id",*(model.columns if columns is None else columns)))),parent,rel))
+        if parent is not None:
+            self.joins.append(f"LEFT JOIN `{model.table}` AS {alias} ON {alias}.`id` = {parent}.`{rel.key}`")
+        for name,subtree in tree.items():
+            child = getattr(model,name)
+            if isinstance(child,belongs_to):
+                self.add(Schema.models[child.model],subtree,alias,child,child.columns)
+            else:
+                self.rest.setdefault(alias,{})[name] = subtree
+
+    def load(self, rows):
+        '''
+        Builds the instances of every table in each row, links them through their relationships and returns the t0 instances.
+        '''
+        built = []
+        for row in rows:
+            instances = {}
+            for alias,model,columns,parent,rel in self.nodes:
+                inst = None if row[f"{alias}__id"] is None else model.build({col : row[f"{alias}__{col}"] for col in columns})
+                instances[alias] = inst
+                if parent is not None and instances[parent] is not None:
+                    instances[parent]._related[rel.name] = inst
+            built.append(instances)
+        for alias,tree in self.rest.items():
+            load_tree(Collection({id(inst) : inst for instances in built if (inst := instances[alias]) is not None}.values()),tree)
+        return [instances["t0"] for instances in built]
+
+@lru_cache(maxsize=256)
+def plan(model, paths, columns=None):
+    '''
+    Returns the Join plan of a class for the given relationship paths, built once per shape.
+    '''
+    return Join(model,parse_paths(paths),columns)
+
+class Page(Collection):
+    '''
+    Collection holding one page of results returned by Schema.page.
+
+    Attributes:
+    ----------
+        cursor (str): Opaque cursor to pass as after to get the next page, or None if this is the last page.
+    '''
+    cursor = None
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps([str(val) for val in values]).encode()).decode()
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+class belongs_to:
+    def __init__(self, model, key, columns=None, counter=None):
+        '''
+        Declares a relationship to the row of another table referenced by a foreign key column.
+
+        The related instance is loaded lazily the first time it is accessed, or for a whole
+        collection at once with Collection.with_related.
+
+        Example usages:
+        --------------
+            ``asker = belongs_to("User","asker_id") -> question.asker is the user whose id is in asker_id``
+
+            ``asker = belongs_to("User","asker_id",columns=("username",)) -> only loads the user's id and username up front``
+
+            ``asker = belongs_to("User","asker_id",counter="question_count") -> users.question_count is kept equal to the user's number of questions``
+
+        Attributes:
+        ----------
+            model (str): Name of the class of the related table.
+
+            key (str): Name of the foreign key column, stored on instances as _key.
+
+            columns (tuple): Columns to load for the related row, the rest are deferred. Loads every column if None.
+
+            counter (str): Column of the related table counting the rows that point at it, moved in the same transaction as every create, update and delete.
+        '''
+        self.model = model
+        self.key = key
+        self.attr = f"_{key}"
+        self.columns = columns
+        self.counter = counter
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self
+        if self.name not in inst._related:
+            fk = getattr(inst,self.attr)
+            inst._related[self.name] = Schema.models[self.model].retrieve_one(columns=self.columns,id=fk) if fk is not None else None
+        return inst._related[self.name]
+
+    def load(self, items):
+        '''
+        Loads the relationship for every given instance with a single WHERE id IN (...) query.
+        '''
+        model = Schema.models[self.model]
+        pending = [item for item in items if self.name not in item._related]
+        found = {}
+        for id in {getattr(item,self.attr) for item in pending} - {None}:
+            found[id] = model.identified(id)
+        missing = tuple(id for id,inst in found.items() if inst is None)
+        if missing:
+            found.update((inst.id,inst) for inst in model.retrieve_all(columns=self.columns,id=missing))
+        for item in pending:
+            item._related[self.name] = found.get(getattr(item,self.attr))
+
+class has_many:
+    def __init__(self, model, key, **filters):
+        '''
+        Declares a relationship to the rows of another table whose foreign key column points back at this row.
+
+        The related collection is loaded the first time it is accessed and then kept on the instance.
+
+        Example usages:
+        --------------
+            ``answers = has_many("Answer","question_id") -> question.answers is every answer with question_id of the question``
+
+            ``answers = has_many("Answer","question_id",selected=False) -> only the answers that were not selected``
+
+        Attributes:
+        ----------
+            model (str): Name of the class of the related table.
+
+            key (str): Name of the foreign key column in the related table.
+
+            filters (**str): Key word arguments for any extra column values the related rows must match.
+        '''
+        self.model = model
+        self.key = key
+        self.filters = filters
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def fetch(self, inst):
+        return Schema.models[self.model].retrieve_all(**{self.key : inst.id},**self.filters)
+
+    def page(self, inst, limit, after=None, **kwargs):
+        '''
+        Retrieves one page of the relationship of the given instance using Schema.page.
+
+        Example usages:
+        --------------
+            ``Question.answers.page(question,20) -> first 20 answers of question``
+
+            ``Question.answers.page(question,20,after=page.cursor) -> the 20 answers after the previous page``
+        '''
+        return Schema.models[self.model].page(limit,after,**kwargs,**{self.key : inst.id},**self.filters)
+
+    async def apage(self, inst, limit, after=None, **kwargs):
+        '''
+        Async counterpart of page.
+        '''
+        return await asyncio.to_thread(self.page,inst,limit,after,**kwargs)
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self
+        if self.name not in inst._related:
+            inst._related[self.name] = self.fetch(inst)
+        return inst._related[self.name]
+
+class has_one(has_many):
+    '''
+    Same as has_many but for a relationship that matches at most one row, which is returned instead of a collection.
+
+    Example usages:
+    --------------
+        ``selected_answer = has_one("Answer","question_id",selected=True)``
+    '''
+    def fetch(self, inst):
+        return Schema.models[self.model].retrieve_one(**{self.key : inst.id},**self.filters) or None
+
+class materialized:
+    def __init__(self, size=1000, ttl=30, **filters):
+        '''
+        Declares an in-memory list of the ids of the newest rows matching filters, updated as the class writes rows.
+
+        A page of the list costs a single query for the rows on it by id, which the identity map
+        and the cache usually answer, instead of a search of the table. Only writes made by this
+        process are seen, so the list is also rebuilt from the database every ttl seconds.
+
+        Example usages:
+        --------------
+            ``recent_unanswered = materialized(answered=0) -> Question.recent_unanswered.page(25) is the 25 newest unanswered questions``
+
+        Attributes:
+        ----------
+            size (int): Number of ids kept. Pages past the end of the list are read with Schema.page.
+
+            ttl (float): Seconds after which the list is rebuilt.
+
+            filters (**str): Column values the rows must match.
+        '''
+        self.size = size
+        self.ttl = ttl
+        self.filters = filters
+        self.ids = None#newest first, None until built
+        self.built = 0.0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.model = owner
+        self.name = name
+
+    def rebuild(self):
+        '''
+        Reads the ids of the newest matching rows from the database.
+        '''
+        with self._lock:
+            writes = self.writes
+        data = dict(self.filters)
+        query = statements.select(self.model.table,(),statements.shape(data),statements.order("id",True,False),True)
+        rows = reader().query_db(query,dict(data,_limit=self.size))
+        with self._lock:
+            if rows is False or writes != self.writes:#a write happened while reading, rebuild on the next read
+                self.built = 0.0
+                return
+            self.ids = [row["id"] for row in rows]
+            self.built = time.monotonic()
+
+    def added(self, id, data):
+        with self._lock:
+            self.writes += 1
+            if self.ids is None:
+                return
+            if id is None or not all(col in data for col in self.filters):#id unknown or left to the column's default, rebuild on the next read
+                self.built = 0.0
+            elif all(data[col] == val for col,val in self.filters.items()):
+                self.ids.insert(0,id)#new rows get the highest ids
+                del self.ids[self.size:]
+
+    def updated(self, id, data):
+        if not any(col in data for col in self.filters):
+            return
+        with self._lock:
+            self.writes += 1
+            if self.ids is None:
+                return
+            if id is None or not all(col in data for col in self.filters):#can't tell which rows match now
+                self.built = 0.0
+            elif not all(data[col] == val for col,val in self.filters.items()):
+                if id in self.ids:
+                    self.ids.remove(id)
+            elif id not in self.ids and (len(self.ids) < self.size or id > self.ids[-1]):
+                self.ids.append(id)
+                self.ids.sort(reverse=True)
+                del self.ids[self.size:]
+
+    def removed(self, ids):
+        with self._lock:
+            self.writes += 1
+            if self.ids is None:
+                return
+            if ids is None:
+                self.built = 0.0
+            else:
+                ids = set(ids)
+                self.ids = [id for id in self.ids if id not in ids]
+
+    def page(self, limit, after=None, columns=None, join=()):
+        '''
+        Retrieves one page of the list, newest first. Cursors are the same as those of Schema.page on id, descending.
+
+        Example usages:
+        --------------
+            ``Question.recent_unanswered.page(25,after=page.cursor,columns=("question",))``
+        '''
+        if self.ids is None or time.monotonic() - self.built > self.ttl:
+            self.rebuild()
+        with self._lock:
+            ids = self.ids
+            if ids is not None:
+                start = 0
+                try:
+                    if after:
+                        last = int(decode_cursor(after)[0])
+                        start = next((i for i,id in enumerate(ids) if id < last),len(ids))
+                except (ValueError,TypeError,IndexError):#malformed cursor, start from the first page
+                    pass
+                window = ids[start:start+limit+1]
+                complete = len(ids) < self.size#the list holds every matching row
+        if ids is None or (len(window) <= limit and not complete):
+            return self.model.page(limit,after,desc=True,columns=columns,join=join,**self.filters)
+        found = {inst.id : inst for inst in self.model.retrieve_all(columns=columns,join=join,id=window[:limit])} if window else {}
+        page = Page(found[id] for id in window[:limit] if id in found)
+        if len(window) > limit:
+            page.cursor = encode_cursor(window[limit-1])
+        return page
+
+    async def apage(self, limit, after=None, **kwargs):
+        return await asyncio.to_thread(self.page,limit,after,**kwargs)
+
+class Context(dict):
+    '''
+    Shared by every validator run by a single call to Schema.validate, so entities loaded by one validator can be reused by the others.
+
+    Validators get it by taking a parameter named context.
+    '''
+    def load(self, key, loader):
+        '''
+        Returns the entity stored under key, calling loader to load it the first time.
+
+        Example usages:
+        --------------
+            ``user = context.load("user",lambda : User.retrieve_one(email=val)) -> only the first validator asking for it queries``
+        '''
+        if key not in self:
+            self[key] = loader()
+        return self[key]
+
+class Validation:
+    '''
+    Result of Schema.validate, truthy if every validator passed.
+
+    Entities the validators loaded into the context can be read as attributes, e.g. validation.user.
+    '''
+    def __init__(self, valid, context):
+        self.valid = valid
+        self.context = context
+
+    def __bool__(self):
+        return self.valid
+
+    def __getattr__(self, name):#only called for names that are not attributes, so look in the context
+        try:
+            return self.context[name]
+        except KeyError:
+            raise AttributeError(f"Nothing named {name!r} was loaded while validating") from None
+
+def transaction():
+    '''
+    Returns a with block running every query made through Schema inside one transaction, committed when it exits.
+
+    Writes go out as they are made, so ids of created rows can be used further down, but nothing
+    is committed until the block exits: one commit for the whole block, or a rollback if it raised.
+    Cached rows and materialized lists are only updated once the block commits. Reads inside
+    the block skip the cache, and can lock the rows they read with lock=True (see Query.for_update).
+    A block nested in another joins it.
+
+    Example usages:
+    --------------
+        \n::
+
+        with transaction():
+            question = Question.retrieve_one(id=1,lock=True)
+            if not question.answered:
+                question.update(answered=True)
+                Answer.update(id=2,selected=True)
+    '''
+    return connectToMySQL(db).transaction()
+
+def atomic(func=None, retries=3):
+    '''
+    Decorator running the decorated function inside a transaction, see transaction.
+
+    If the transaction deadlocks (or times out waiting on a lock) it is rolled back and the function
+    is run again from the start, up to retries more times after a short random pause. A function
+    called inside another transaction joins it and leaves retrying to the outermost one.
+
+    Example usages
+    --------------
+        \n::
+
+        @atomic
+        def approve(question_id, answer_id):
+            ...
+
+        @atomic(retries=5)
+        def transfer(...):
+            ...
+    '''
+    if func is None:
+        return partial(atomic,retries=retries)
+    @wraps(func)
+    def inner(*args, **kwargs):
+        nested = in_transaction(db)
+        for attempt in range(retries+1):
+            try:
+                with transaction():
+                    return func(*args,**kwargs)
+            except Exception as e:
+                if nested or attempt == retries or not is_deadlock(e):
+                    raise
+            time.sleep(random.uniform(0,0.01*2**attempt))#keep the retries of both sides of a deadlock from colliding again
+    return inner
+
+class by_id:
+    '''
+    Decorator for class methods that can also be called on an instance, in which case the instance's id is passed as the id key word argument.
+
+    A single descriptor on the class replaces the lambdas that used to be attached to every instance.
+    Called on an instance, passing id as well is a TypeError, so data from a form can never retarget the call at another row.
+
+    Example usages:
+    --------------
+        ``User.delete(id=1) -> called on the class like any class method``
+
+        ``my_user.delete() -> same as User.delete(id=my_user.id)``
+    '''
+    def __init__(self, func):
+        self.func = func
+        update_wrapper(self,func)
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self.func.__get__(owner)
+        func,id = self.func,inst.id
+        def bound(**data):
+            if "id" in data:
+                raise TypeError(f"{func.__name__}() got multiple values for argument 'id'")
+            return func(owner,id=id,**data)
+        return bound
+
+class Query:
+    def __init__(self, model, data=None, options=None):
+        '''
+        An immutable, chainable description of a query against a class's table, returned by Schema.query.
+
+        Every method returns a new Query and leaves the one it was called on untouched, so a query
+        can be kept around, extended and shared between threads. Nothing is sent to the database
+        until one of the retrieve methods is called.
+
+        Example usages:
+        --------------
+            ``Question.query().filter(answered=0).order_by("created_at",desc=True).limit(10).retrieve_all()``
+
+            ``newest = Question.query().order_by("id",desc=True) -> newest.filter(asker_id=1).retrieve_one()``
+
+        Attributes:
+        ----------
+            model (Schema): Class of the table to query.
+
+            data (dict): Column values the rows must match, as passed to retrieve_all.
+
+            options (dict): Key word arguments for limit, offset, order, columns, join and lock, as passed to retrieve_all.
+        '''
+        self.model = model
+        self.data = data or {}
+        self.options = options or {}
+
+    def _with(self, data=None, **options):
+        return Query(self.model,{**self.data,**(data or {})},{**self.options,**options})
+
+    def filter(self, **data):
+        '''
+        Returns a query also matching the given column values. Lists match any of their values.
+        '''
+        return self._with(data)
+
+    def order_by(self, col="id", desc=False, rand=False):
+        '''
+        Returns a query sorted on the given column, or in random order if rand.
+        '''
+        if not rand and col not in self.model.columns:
+            raise ValueError(f"{self.model.__name__} has no column {col!r} to order by")
+        return self._with(order=(col,desc,rand))
+
+    def limit(self, limit, offset=None):
+        '''
+        Returns a query returning at most limit rows, after skipping offset rows.
+        '''
+        return self._with(limit=limit,offset=offset)
+
+    def only(self, *columns):
+        '''
+        Returns a query loading only the given columns (and id), deferring the rest until read.
+        '''
+        return self._with(columns=columns)
+
+    def join(self, *paths):
+        '''
+        Returns a query loading the given relationship paths along with the rows, see Collection.join.
+        '''
+        return self._with(join=(*self.options.get("join",()),*paths))
+
+    def for_update(self):
+        '''
+        Returns a query locking the rows it reads until the end of the transaction it runs in, see transaction.
+        '''
+        return self._with(lock=True)
+
+    def retrieve_all(self, **data):
+        return self.model.retrieve_all(**self.options,**{**self.data,**data})
+
+    def retrieve_one(self, **data):
+        options = {key : val for key,val in self.options.items() if key in ("order","columns","join","lock")}
+        return self.model.retrieve_one(**options,**{**self.data,**data})
+
+    def page(self, limit, after=None, **data):
+        '''
+        Retrieves one page of the matching rows with Schema.page, seeking on the column the query is ordered by.
+        '''
+        col,desc,rand = self.options.get("order",("id",False,False))
+        if rand:
+            raise ValueError("Random order cannot be paged")
+        options = {key : val for key,val in self.options.items() if key in ("columns","join")}
+        return self.model.page(limit,after,col,desc,**options,**{**self.data,**data})
+
+    def iter_all(self, batch_size=1000, **data):
+        options = {key : val for key,val in self.options.items() if key in ("order","columns")}
+        return self.model.iter_all(batch_size,**options,**{**self.data,**data})
+
+    async def aretrieve_all(self, **data):
+        return await asyncio.to_thread(self.retrieve_all,**data)
+
+    async def aretrieve_one(self, **data):
+        return await asyncio.to_thread(self.retrieve_one,**data)
+
+    async def apage(self, limit, after=None, **data):
+        return await asyncio.to_thread(self.page,limit,after,**data)
+
+    def __repr__(self):#more readable representation
+        return f"<Query obj: table={self.model.table}, data={self.data}, options={self.options}>"
 
 class Schema:
     '''
@@ -11,15 +749,209 @@ class Schema:
 
     Should only ever be extended and not instantiated on its own.
     '''
+    __slots__ = ("_related",)#the table decorator adds a slot for every column, instances have no __dict__
+    models = {}#every class decorated with table, by class name
+    cache = None#QueryCache set by the cached decorator
+    columns = ()#column names of the table, declared by each class
+    fulltext = ()#columns covered by the table's FULLTEXT index, used by search
+    attrs = {}#column name -> attribute name, filled in by the table decorator
+    fields = {}#attribute name -> column name, filled in by the table decorator
+    members = {}#attribute name -> slot descriptor, filled in by the table decorator
+    setters = {}#column name -> function setting its slot on an instance, filled in by the table decorator
+    constructors = {}#(row keys, tuples) -> generated function building an instance, filled in as rows are seen
+    counters = ()#belongs_to relationships declaring a counter, filled in by the table decorator
+    parents = ()#names of the classes holding those counters
+    lists = ()#materialized lists of the class, filled in by the table decorator
+
     @classmethod
-    def order_by(cls,col="id",desc=False,rand=False):
-        config = {
-            "order_by" : col,
-            "desc" : desc,
-            "rand" : rand
-        }
-        setattr(cls,"config",config)
-        return cls
+    def query(cls):
+        '''
+        Returns an empty Query against the class's table to build on.
+
+        Example usages:
+        --------------
+            ``User.query().filter(username="John").retrieve_one()``
+        '''
+        return Query(cls)
+
+    @classmethod
+    def order_by(cls,col="id",desc=False,rand=False):#shortcut for query().order_by, keeps no state on the class
+        return cls.query().order_by(col,desc,rand)
+
+    @classmethod
+    def ordering(cls, order, alias=''):
+        '''
+        ORDER BY clause for an order tuple of (column, descending, random), qualified by alias if given.
+        '''
+        if not order:
+            return ''
+        col,desc,rand = order
+        if not rand and col not in cls.columns:#never let an unknown name into the SQL
+            raise ValueError(f"{cls.__name__} has no column {col!r} to order by")
+        return statements.order(col,desc,rand,alias)
+
+    @classmethod
+    def select(cls, query, data=None, tables=None):
+        '''
+        Runs a SELECT query against the class's table, going through the class's cache if it has one.
+
+        Queries that JOIN other tables should list all of them in tables so writes to any of them drop the cached rows.
+        '''
+        if cls.cache is None or "RAND()" in query or in_transaction(db):#rows read in a transaction may hold its uncommitted writes
+            return reader().query_db(query,data)
+        tables = tables or (cls.table,)
+        key = (query,tuple(sorted(data.items())) if data else ())
+        rows = cls.cache.get(key)
+        if rows is None:
+            generation = cls.cache.generation(*tables)
+            rows = reader().query_db(query,data)
+            if rows is not False:
+                cls.cache.set(key,rows,tables,generation)
+        return rows
+
+    @classmethod
+    def instances(cls, rows, joined=None):
+        '''
+        Builds class instances from rows, splitting out and linking the related instances if the rows came from a Join plan.
+        '''
+        if joined is not None:
+            return joined.load(rows)
+        if not rows:
+            return []
+        make = cls.constructor(tuple(rows[0]))#every row of a result has the same columns
+        if identity_map() is None:
+            return [make(row) for row in rows]
+        return [cls.build(row,make) for row in rows]
+
+    @classmethod
+    def identified(cls, id):
+        '''
+        Returns the instance with the given id if it was already loaded during the current request, otherwise None.
+        '''
+        instances = identity_map()
+        if instances is None:
+            return None
+        return instances.get(cls.table,{}).get(id)
+
+    @classmethod
+    def build(cls, row, make=None):
+        '''
+        Creates a class instance from a row, reusing the instance already loaded for the same id during the current request.
+
+        make is the constructor of the row's columns if already known, see constructor.
+        '''
+        make = make or cls.from_row
+        instances = identity_map()
+        if instances is None:
+            return make(row)
+        table = instances.setdefault(cls.table,{})
+        inst = table.get(row['id'])
+        if inst is None:
+            inst = table[row['id']] = make(row)
+        elif inst.deferred():#fill in whatever the earlier partial load left out
+            for attr in inst.deferred():
+                if cls.fields[attr] in row:
+                    setattr(inst,attr,row[cls.fields[attr]])
+        return inst
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Creates a class instance from a row without going through __init__, setting each column's slot directly.
+
+        Columns of the row that the class does not declare are ignored.
+        '''
+        return cls.constructor(tuple(row))(row)
+
+    @classmethod
+    def constructor(cls, keys, tuples=False):
+        '''
+        Returns a function creating a class instance from a row with the given keys, generated once for each order of keys.
+
+        The generated function sets the slot of every declared column straight from the row, with no
+        loop or lookup of setters per row. With tuples, the rows are tuples of values in the order of
+        keys, as read by a tuple cursor. The class is checked against the live schema the first time.
+
+        Example usages:
+        --------------
+            ``Question.constructor(("id","question"))({"id" : 1,"question" : "Why?"})``
+
+            ``Question.constructor(("id","question"),tuples=True)((1,"Why?"))``
+        '''
+        make = cls.constructors.get((keys,tuples))
+        if make is None:
+            check(cls)
+            make = cls.constructors[(keys,tuples)] = compile_constructor(cls,keys,tuples)
+        return make
+
+    @classmethod
+    def forget(cls, id=None):
+        '''
+        Removes the instance with the given id (or every instance of the class if no id is given) from the identity map.
+        '''
+        instances = identity_map()
+        if instances is None:
+            return
+        if id is None:
+            instances.pop(cls.table,None)
+        else:
+            instances.get(cls.table,{}).pop(id,None)
+
+    @classmethod
+    def check_lock(cls, lock):
+        if lock and not in_transaction(db):#FOR UPDATE in autocommit mode releases the lock as soon as it is taken
+            raise RuntimeError(f"{cls.__name__} rows can only be locked inside a transaction")
+
+    @classmethod
+    def locked(cls, rows, lock):
+        '''
+        Forgets the instances loaded earlier in the request for rows read under lock, which are newer than them.
+        '''
+        if lock and rows:
+            for row in rows:
+                cls.forget(row["id"])
+        return rows
+
+    @classmethod
+    def counts(cls, rows, sign, rels=None):
+        '''
+        Statements moving the counter of each parent the given rows point at by sign for every row, for each belongs_to relationship declaring a counter.
+        '''
+        moves = []
+        for rel in cls.counters if rels is None else rels:
+            parent = Schema.models[rel.model]
+            for id,count in Counter(row.get(rel.key) for row in rows).items():
+                if id is not None:
+                    parent.forget(id)
+                    untouched = ("updated_at",) if "updated_at" in parent.columns else ()#a new answer is not an edit of its question
+                    moves.append((statements.increment(parent.table,rel.counter,untouched),{"id" : id,"_by" : sign*count}))
+        return moves
+
+    @classmethod
+    def guarded(cls, func):
+        '''
+        Runs func inside a transaction (retried on deadlocks, see atomic) and returns its result.
+
+        If it fails outside of an enclosing transaction, the error is logged and False returned like
+        query_db does. Inside one, the error is raised for the enclosing transaction to roll back.
+        '''
+        try:
+            return atomic(func)()
+        except Exception as e:
+            if in_transaction(db):
+                raise
+            logger.error("Transaction failed: %s",e)
+            return False
+
+    @classmethod
+    def written(cls, counted=True):
+        '''
+        Drops the cached rows of the class, and those of the classes holding its counters if they were moved.
+
+        Inside a transaction, they are dropped once it commits.
+        '''
+        mark_write()
+        after_commit(invalidate,cls.table,*(Schema.models[model].table for model in (cls.parents if counted else ())))
 #-------------------Create---------------------#
     @classmethod
     def create(cls, **data):
@@ -40,11 +972,75 @@ class Schema:
         -------
             Id of the newly created row or False if query failed.
         '''
-        query = f"INSERT INTO `{cls.table}` ({', '.join(f'`{col}`' for col in data.keys())}) VALUES ({', '.join(f'%({col})s' for col in data.keys())})"
-        return connectToMySQL(db).query_db(query,data)
+        query = statements.insert(cls.table,tuple(data))
+        if cls.counters:
+            results = connectToMySQL(db).transact_db([(query,data),*cls.counts([data],1)])
+            result = results and results[0][0]
+        else:
+            result = connectToMySQL(db).query_db(query,data)
+        cls.written()#after the write so reads racing it are not cached
+        if result:
+            for rows in cls.lists:
+                after_commit(rows.added,result,data)
+        return result
+
+    @classmethod
+    def bulk_create(cls, rows, returning=True):
+        '''
+        Creates many new rows in the database with multi-row inserts inside a single transaction.
+
+        Rows are split into as few statements as fit under the server's max_allowed_packet.
+        Either every row is created or, if any statement fails, none are. The ids of a multi-row
+        insert are only worked out from the first one if the server's auto-increment lock mode
+        makes them consecutive (innodb_autoinc_lock_mode 0 or 1). Otherwise, as under MySQL 8's
+        default of 2, each row is inserted by its own statement to report its id, which costs a round
+        trip per row: pass returning=False to always use multi-row inserts when the ids are not needed.
+
+        Example usages:
+        --------------
+            ``User.bulk_create([{"name":"John","age":35},{"name":"Jane","age":32}]) -> creates both users``
+
+            ``Answer.bulk_create(imported,returning=False) -> number of answers created``
+
+        Parameters
+        ----------
+            rows (list): Dictionaries of column names and values to create, all with the same columns.
+
+            returning (bool): Whether to return the ids of the rows.
+
+        Returns
+        -------
+            List of ids of the newly created rows, in the order given (their number if not returning), or False if the query failed.
+        '''
+        rows = list(rows)
+        if not rows:
+            return [] if returning else 0
+        columns = tuple(rows[0])
+        connection = connectToMySQL(db)
+        step,consecutive = connection.auto_increment()
+        if consecutive or not returning:
+            batch = [
+                (statements.insert_many(cls.table,columns,len(chunk)),[val for row in chunk for val in row])
+                for chunk in statements.chunks((tuple(row[col] for col in columns) for row in rows),connection.packet_size()*9//10)
+            ]
+        else:#interleaved with concurrent inserts, the ids of one statement can have gaps
+            batch = [(statements.insert(cls.table,columns),row) for row in rows]
+        results = connection.transact_db(batch+cls.counts(rows,1))
+        cls.written()
+        if results is False:
+            return False
+        if not returning:
+            for lst in cls.lists:
+                after_commit(lst.added,None,{})#ids unknown, rebuilt on the next read
+            return sum(count for first,count in results[:len(batch)])
+        ids = [id for first,count in results[:len(batch)] for id in range(first,first+count*step,step)]
+        for lst in cls.lists:
+            for id,row in zip(ids,rows):
+                after_commit(lst.added,id,row)
+        return ids
 #-------------------Retrieve-------------------#
     @classmethod
-    def retrieve_all(cls, **data):
+    def retrieve_all(cls, limit=None, offset=None, columns=None, join=(), order=None, lock=False, **data):
         '''
         Retrieves everything from the database that matches the given data in the form of a list.
 
@@ -58,23 +1054,190 @@ class Schema:
 
             ``User.retrieve(name="John") -> returns a list of all users with the name "John"``
 
+            ``User.retrieve(id=[1,2,3]) -> returns a list of the users with any of the given ids``
+
+            ``User.retrieve(limit=10,offset=20) -> returns the third set of 10 users``
+
+            ``User.retrieve(columns=["username"]) -> returns every user with only id and username loaded``
+
+            ``User.retrieve(order=("created_at",True,False)) -> returns every user, newest first. See also Query.order_by``
+
+        Parameters
+        ----------
+            limit (int) : Maximum number of rows to return.
+
+            offset (int) : Number of rows to skip, only used along with limit. Prefer page for deep pages.
+
+            columns (list) : Columns to load, the rest are deferred until read. Loads every column if None.
+
+            join (tuple) : Relationship paths to load along with the rows, see Collection.join. belongs_to relationships are JOINed into the same query.
+
+            order (tuple) : Column to sort by, whether to sort descending and whether to sort randomly instead.
+
+            lock (bool) : Lock the matching rows until the end of the transaction (SELECT ... FOR UPDATE). Only inside a transaction.
+
+            data (**str) : Key word arguments for each of the column names and the values to try and match. Lists match any of their values.
+
+        Returns
+        -------
+            Collection of class instances created from the matching rows in the database.
+        '''
+        filters = statements.shape(data)
+        if filters is None:
+            return Collection()
+        cls.check_lock(lock)
+        joined = plan(cls,tuple(join),columns and tuple(columns)) if join else None
+        query = statements.select(cls.table,columns and tuple(columns),filters,cls.ordering(order,joined and joined.alias),limit is not None,bool(offset),joined,lock)
+        if limit is not None:
+            data.update(_limit=int(limit),_offset=int(offset or 0))
+        return Collection(cls.instances(cls.locked(cls.select(query,data,joined and joined.tables) or [],lock),joined))
+
+    @classmethod
+    def iter_all(cls, batch_size=1000, columns=None, order=None, **data):
+        '''
+        Lazily iterates over everything in the database that matches the given data.
+
+        Rows are streamed from an unbuffered cursor batch_size at a time and turned into
+        instances one by one, so memory use stays flat no matter how many rows match.
+        Instances are not cached or kept in the identity map.
+
+        Example usages:
+        --------------
+            ``for answer in Answer.iter_all(): ... -> iterates over every answer``
+
+            ``for answer in Answer.iter_all(batch_size=500,answerer_id=1): ...``
+
+        Parameters
+        ----------
+            batch_size (int) : Number of rows fetched from the database at a time.
+
+            columns (list) : Columns to load, the rest are deferred until read. Loads every column if None.
+
+            order (tuple) : Column to sort by, whether to sort descending and whether to sort randomly instead.
+
+            data (**str) : Key word arguments for each of the column names and the values to try and match.
+
+        Returns
+        -------
+            Generator of class instances created from the matching rows in the database.
+        '''
+        filters = statements.shape(data)
+        if filters is None:
+            return
+        columns = tuple(dict.fromkeys(("id",*(columns or cls.columns))))#named rather than *, so the order of the values is known
+        query = statements.select(cls.table,columns,filters,cls.ordering(order))
+        make = cls.constructor(columns,tuples=True)
+        for values in reader().stream_db(query,data,batch_size,tuples=True):
+            yield make(values)
+
+    @classmethod
+    def page(cls, limit, after=None, col="id", desc=False, columns=None, join=(), **data):
+        '''
+        Retrieves one page of the rows matching the given data using keyset pagination.
+
+        Rather than skipping rows with OFFSET, each page seeks past the last row of the previous
+        page on an indexed column, so every page costs the same no matter how deep it is.
+        Columns other than id are tie-broken on id so rows sharing a value are not skipped.
+
+        Example usages:
+        --------------
+            ``Question.page(20,answered=0) -> first 20 unanswered questions by id``
+
+            ``Question.page(20,after=page.cursor,answered=0) -> the next 20``
+
+            ``Question.page(20,col="created_at",desc=True) -> 20 newest questions``
+
         Parameters
         ----------
+            limit (int) : Number of rows per page.
+
+            after (str) : Cursor of the previous page, or None for the first page.
+
+            col (str) : Column to order and seek on.
+
+            desc (bool) : Whether to page from the highest value down.
+
+            columns (list) : Columns to load, the rest are deferred until read. Loads every column if None.
+
+            join (tuple) : Relationship paths to load along with the rows, see Collection.join. belongs_to relationships are JOINed into the same query.
+
             data (**str) : Key word arguments for each of the column names and the values to try and match.
 
         Returns
         -------
-            List of class instances created from the matching rows in the database.
+            Page of class instances, with a cursor for the next page.
         '''
-        config = getattr(cls,'config',None)
-        if config:
-            config = f"ORDER BY {'RAND()' if config['rand'] else config['col']} {'DESC' if config['desc'] else 'ASC'}"
-            delattr(cls,"config")
-        query = f"SELECT * FROM `{cls.table}` {'WHERE'+' AND'.join(f' `{col}`=%({col})s' for col in data.keys()) if data else ''} {config if config else ''}"
-        return [cls(**item) for item in  connectToMySQL(db).query_db(query,data)]
+        filters = statements.shape(data)
+        if filters is None:
+            return Page()
+        params = dict(data,_limit=int(limit)+1)
+        try:
+            values = decode_cursor(after) if after else None
+            if values and col == "id":
+                params["_after"], = values
+            elif values:
+                params["_after"],params["_after_id"] = values
+        except (ValueError,TypeError):#malformed cursor, start from the first page
+            values = None
+        joined = plan(cls,tuple(join),columns and (col,*columns)) if join else None
+        query = statements.seek(cls.table,columns and (col,*columns),filters,col,desc,bool(values),joined)
+        rows = cls.select(query,params,joined and joined.tables) or []
+        page = Page(cls.instances(rows[:limit],joined))
+        if len(rows) > limit:
+            last = page[-1]
+            page.cursor = encode_cursor(last.id) if col == "id" else encode_cursor(getattr(last,col),last.id)
+        return page
 
     @classmethod
-    def retrieve_one(cls, **data):
+    def search(cls, text, limit=20, after=None, columns=None, **data):
+        '''
+        Retrieves one page of the rows whose fulltext columns best match the given text, best matches first.
+
+        Uses the table's FULLTEXT index (see the indexes command), so the cost depends on the
+        number of matches rather than the size of the table. Results are cached like any other
+        read if the class is cached.
+
+        Example usages:
+        --------------
+            ``Question.search("flask sessions") -> the 20 questions best matching "flask sessions"``
+
+            ``Question.search("flask sessions",after=page.cursor,answered=1) -> the next 20 answered ones``
+
+        Parameters
+        ----------
+            text (str) : Words to search for.
+
+            limit (int) : Number of rows per page.
+
+            after (str) : Cursor of the previous page, or None for the first page.
+
+            columns (list) : Columns to load, the rest are deferred until read. Loads every column if None.
+
+            data (**str) : Key word arguments for each of the column names and the values to try and match.
+
+        Returns
+        -------
+            Page of class instances, with a cursor for the next page.
+        '''
+        if not cls.fulltext:
+            raise TypeError(f"{cls.__name__} declares no fulltext columns to search")
+        text = (text or "").strip()
+        filters = statements.shape(data)
+        if not text or filters is None:
+            return Page()
+        try:
+            offset = int(decode_cursor(after)[0]) if after else 0
+        except (ValueError,TypeError,IndexError):#malformed cursor, start from the first page
+            offset = 0
+        query = statements.search(cls.table,columns and tuple(columns),cls.fulltext,filters)
+        rows = cls.select(query,dict(data,_text=text,_limit=int(limit)+1,_offset=offset)) or []
+        page = Page(cls.instances(rows[:limit]))
+        if len(rows) > limit:
+            page.cursor = encode_cursor(offset+limit)
+        return page
+
+    @classmethod
+    def retrieve_one(cls, columns=None, join=(), order=None, lock=False, **data):
         '''
         Retrieves everything from the database that matches the given data in the form of a list.
 
@@ -90,23 +1253,37 @@ class Schema:
 
         Parameters
         ----------
+            columns (list) : Columns to load, the rest are deferred until read. Loads every column if None.
+
+            join (tuple) : Relationship paths to load along with the rows, see Collection.join. belongs_to relationships are JOINed into the same query.
+
+            order (tuple) : Column to sort by, whether to sort descending and whether to sort randomly instead.
+
+            lock (bool) : Lock the matching row until the end of the transaction (SELECT ... FOR UPDATE). Only inside a transaction.
+
             data (**str) : Key word arguments for each of the column names and the values to try and match.
 
         Returns
         -------
             List of class instances created from the matching rows in the database or False if query failed.
         '''
-        config = getattr(cls,'config',None)
-        if config:
-            config = f"ORDER BY {config['rand'] if config['rand'] else config['col']} {'DESC' if config['desc'] else 'ASC'}"
-            delattr(cls,"config")
-        query = f"SELECT * FROM `{cls.table}` {'WHERE'+' AND'.join(f' `{col}`=%({col})s' for col in data.keys()) if data else ''} {config if config else ''} LIMIT 1"
-        result = connectToMySQL(db).query_db(query,data)
+        if not order and not lock and list(data) == ['id'] and not isinstance(data['id'],(list,tuple,set,frozenset)):#a list of ids is queried
+            inst = cls.identified(data['id'])
+            if inst is not None:
+                return inst.join(*join) if join else inst
+        filters = statements.shape(data)
+        if filters is None:
+            return ()
+        cls.check_lock(lock)
+        joined = plan(cls,tuple(join),columns and tuple(columns)) if join else None
+        query = statements.select(cls.table,columns and tuple(columns),filters,cls.ordering(order,joined and joined.alias),True,False,joined,lock)
+        data['_limit'] = 1
+        result = cls.locked(cls.select(query,data,joined and joined.tables),lock)
         if result:
-            result = cls(**result[0])
+            result = cls.instances(result,joined)[0]
         return result
 #-------------------Update---------------------#
-    @classmethod
+    @by_id
     def update(cls,id=None,**data):#TODO allow for filter dict paramater instead of id
         '''
         Updates the target instance in the database with the given data.
@@ -131,10 +1308,84 @@ class Schema:
         -------
             None if successful or False if query failed.
         '''
-        query = f"UPDATE `{cls.table}` SET {', '.join(f'`{col}`=%({col})s' for col in data.keys())} {f'WHERE `id`={id}' if id else ''}"
-        return connectToMySQL(db).query_db(query,data)
-#-------------------Delete---------------------#
+        cls.forget(id)
+        query = statements.update(cls.table,tuple(data),bool(id))
+        moved = tuple(rel for rel in cls.counters if rel.key in data)
+        if moved and id:#move the counters from the old parents to the new ones
+            def move():#the old parents are locked so a concurrent update cannot move the row in between
+                old = connectToMySQL(db).query_db(statements.select(cls.table,tuple(rel.key for rel in moved),(("id",False),),'',True,lock=True),{"id" : id,"_limit" : 1}) or []
+                connectToMySQL(db).transact_db([(query,dict(data,_id=id)),*cls.counts(old,-1,moved),*cls.counts([data]*len(old),1,moved)])#nothing moves if the row does not exist
+            result = cls.guarded(move)
+        else:
+            result = connectToMySQL(db).query_db(query,dict(data,_id=id))
+        cls.written(bool(moved))
+        if result is not False:
+            for rows in cls.lists:
+                after_commit(rows.updated,id,data)
+        return result
+
+    @classmethod
+    def bulk_update(cls, ids, **data):
+        '''
+        Updates every row whose id is in ids with the given data inside a single transaction.
+
+        Counters of the parents a changed foreign key points away from and to are moved with it.
+
+        Example usages:
+        --------------
+            ``Question.bulk_update([1,2,3],answered=True) -> marks questions 1, 2 and 3 as answered``
+
+        Parameters
+        ----------
+            ids (list) : Ids of the rows to update.
+
+            data (**str) : Key word arguments for each of the column names and the new values to update with.
+
+        Returns
+        -------
+            Number of rows updated or False if the query failed.
+        '''
+        ids = list(ids)
+        moved = tuple(rel for rel in cls.counters if rel.key in data)
+        result = cls.bulk(ids,statements.update_many(cls.table,tuple(data)),lambda chunk : dict(data,_ids=chunk),moved,data)
+        if result is not False:
+            for rows in cls.lists:
+                for id in ids:
+                    after_commit(rows.updated,id,data)
+        return result
+
     @classmethod
+    def bulk(cls, ids, query, params, moved=(), to=None):
+        '''
+        Runs query once for each chunk of ids that fits in a packet, inside a single transaction.
+
+        For each relationship in moved, the counters of the parents the rows point at (read under lock
+        in the same transaction) go down by one per row, and if to is given, those of the parents its
+        keys point at go up by one per row, as when an update changes the keys.
+        '''
+        ids = list(ids)
+        if not ids:
+            return 0
+        connection = connectToMySQL(db)
+        chunks = [tuple(id for id, in chunk) for chunk in statements.chunks(((id,) for id in ids),connection.packet_size()*9//10)]
+        batch = [(query,params(chunk)) for chunk in chunks]
+        if moved:
+            keys = tuple(rel.key for rel in moved)
+            def move():#the rows are locked so their parents cannot change before the counters move
+                rows = [row for chunk in chunks for row in connectToMySQL(db).query_db(statements.select(cls.table,keys,(("id",True),),lock=True),{"id" : chunk}) or []]
+                moves = cls.counts(rows,-1,moved)+(cls.counts([to]*len(rows),1,moved) if to is not None else [])
+                return connectToMySQL(db).transact_db(batch+moves)
+            results = cls.guarded(move)
+        else:
+            results = connection.transact_db(batch)
+        for id in ids:
+            cls.forget(id)
+        cls.written(bool(moved))
+        if results is False:
+            return False
+        return sum(count for lastrowid,count in results[:len(chunks)])
+#-------------------Delete---------------------#
+    @by_id
     def delete(cls, **data):
         '''
         Deletes all rows from the database that match the given data.
@@ -155,8 +1406,114 @@ class Schema:
         -------
             None if successful or False if query failed.
         '''
-        query = f"DELETE FROM `{cls.table}` WHERE {' AND '.join(f'`{col}`=%({col})s' for col in data.keys())}"
-        return connectToMySQL(db).query_db(query,data)
+        filters = statements.shape(data)
+        if filters is None:
+            return None
+        cls.forget(data['id'] if filters == (("id",False),) else None)
+        if cls.counters:#read the parents of the rows first so their counters move along with the delete
+            def remove():#the rows are locked until they are deleted, so their parents cannot change in between
+                rows = connectToMySQL(db).query_db(statements.select(cls.table,tuple(rel.key for rel in cls.counters),filters,lock=True),data)
+                if rows:
+                    connectToMySQL(db).transact_db([(statements.delete(cls.table,(("id",True),)),{"id" : tuple(row["id"] for row in rows)}),*cls.counts(rows,-1)])
+                return tuple(row["id"] for row in rows)
+            ids = cls.guarded(remove)
+            if not ids:
+                return False if ids is False else None
+            result = None
+        else:
+            ids = (data['id'],) if filters == (("id",False),) else None
+            result = connectToMySQL(db).query_db(statements.delete(cls.table,filters),data)
+        cls.written()
+        if result is not False:
+            for rows in cls.lists:
+                after_commit(rows.removed,ids)
+        return result
+
+    @classmethod
+    def bulk_delete(cls, ids):
+        '''
+        Deletes every row whose id is in ids inside a single transaction.
+
+        Example usages:
+        --------------
+            ``Answer.bulk_delete(answer.id for answer in spammer.answers) -> deletes all of the spammer's answers``
+
+        Parameters
+        ----------
+            ids (list) : Ids of the rows to delete.
+
+        Returns
+        -------
+            Number of rows deleted or False if the query failed.
+        '''
+        ids = list(ids)
+        result = cls.bulk(ids,statements.delete(cls.table,(("id",True),)),lambda chunk : {"id" : chunk},cls.counters)
+        if result is not False:
+            for rows in cls.lists:
+                after_commit(rows.removed,ids)
+        return result
+#--------------------Async---------------------#
+    # Async counterparts of the methods above for use in async views. Each one runs
+    # its sync counterpart on a worker thread with the current context (so flask.g and
+    # the identity map carry over), letting independent queries be awaited together:
+    #
+    #     user, questions = await asyncio.gather(User.aretrieve_one(id=1), Question.aretrieve_all())
+    @classmethod
+    async def acreate(cls, **data):
+        return await asyncio.to_thread(cls.create,**data)
+
+    @classmethod
+    async def aretrieve_all(cls, **data):
+        return await asyncio.to_thread(cls.retrieve_all,**data)
+
+    @classmethod
+    async def aretrieve_one(cls, **data):
+        return await asyncio.to_thread(cls.retrieve_one,**data)
+
+    @classmethod
+    async def apage(cls, limit, after=None, **data):
+        return await asyncio.to_thread(cls.page,limit,after,**data)
+
+    @classmethod
+    async def asearch(cls, text, limit=20, after=None, **data):
+        return await asyncio.to_thread(cls.search,text,limit,after,**data)
+
+    @by_id
+    async def aupdate(cls, id=None, **data):
+        return await asyncio.to_thread(cls.update,id,**data)
+
+    @by_id
+    async def adelete(cls, **data):
+        return await asyncio.to_thread(cls.delete,**data)
+
+    def join(self, *paths):
+        '''
+        Loads the given relationships of the instance, and the relationships of those, see Collection.join.
+
+        Example usages:
+        --------------
+            ``Question.retrieve_one(id=1).join("answers.answerer","asker")``
+
+        Returns
+        -------
+            The instance, to allow chaining.
+        '''
+        load_tree([self],parse_paths(paths))
+        return self
+
+    async def ajoin(self, *paths):
+        return await asyncio.to_thread(self.join,*paths)
+
+    async def aload(self, *names):
+        '''
+        Loads the given relationships of the instance concurrently.
+
+        Example usages:
+        --------------
+            ``await question.aload("asker","selected_answer") -> both are then read without querying``
+        '''
+        await asyncio.gather(*(asyncio.to_thread(getattr,self,name) for name in names))
+        return self
 #------------------Validate--------------------#
     @classmethod
     def validate(cls, **data):
@@ -164,6 +1521,8 @@ class Schema:
         Validates the given data by applying any validators registered to the class via the validator decorator.
 
         If no validators are registered, then the data will always be considered valid.
+        Validators taking a context parameter share one Context for the call, and whatever they
+        load into it is handed back on the result.
 
         Example usages:
         --------------
@@ -171,23 +1530,28 @@ class Schema:
 
             ``User.validate(name="abc",age="24") -> validates the given attributes``
 
+            ``User.validate(**request.form).user -> user loaded by the login validators``
+
         Parameters
         ----------
             data (**str) : Key word arguments for each of the field names and the values to be validated.
 
         Returns
         -------
-            Boolean determining whether all of the data is valid or not
+            Validation, truthy if all of the data is valid, holding the entities loaded by the validators.
         '''
         is_valid = True
+        context = Context()
         for field,val in data.items():
-            for valid,msg,kwargs in cls.validators.get(field,[]):
+            for valid,msg,kwargs,contextual in cls.validators.get(field,[]):
                 kwargs = {k:data.get(v) for k,v in kwargs.items()}
+                if contextual:
+                    kwargs["context"] = context
                 if not valid(val,**kwargs):
                     flash(msg,f"{cls.__name__}.{field}")
                     is_valid = False
                     # break#limits to one validation per field at a time
-        return is_valid
+        return Validation(is_valid,context)
 
     @classmethod
     def validator(cls,msg,**kwargs):
@@ -197,7 +1561,9 @@ class Schema:
         The method below the decorator should be named the exact same
         as the field you are trying to validate and should return a boolean
         which will be used to determine if the field is valid or not. Flashed
-        message categories will be accessed as "Class.field" format.
+        message categories will be accessed as "Class.field" format. If it
+        takes a parameter named context, it is passed the Context shared by
+        the validators of the same validate call.
 
         Parameters
         ----------
@@ -208,14 +1574,45 @@ class Schema:
         def register(func):
             cls.validators = getattr(cls,"validators",{})
             cls.validators[func.__name__] = cls.validators.get(func.__name__,[])
-            cls.validators[func.__name__].append((func,msg,kwargs))
+            cls.validators[func.__name__].append((func,msg,kwargs,"context" in inspect.signature(func).parameters))
         return register
 #----------------------------------------------#
-    def __new__(cls,*args,**kwargs):#delete and update implictly pass id when called from instance
-        inst = super().__new__(cls)
-        inst.delete = lambda : cls.delete(id=inst.id)
-        inst.update = lambda **data : cls.update(id=inst.id,**data)
-        return inst
+    def __init__(self, **data):#rows may be partial, missing columns are deferred
+        for col,val in data.items():
+            setattr(self,self.attrs.get(col,col),val)
+
+    def __getattr__(self, name):#only called for attributes that were never loaded
+        if name == "_related":#relationships loaded by belongs_to/has_many/has_one, created on first use
+            self._related = {}
+            return self._related
+        if name == "id" or name not in type(self).fields:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        self.load_deferred()
+        return object.__getattribute__(self,name)
+
+    def deferred(self):
+        '''
+        Returns the names of the attributes whose columns were left out when the instance was loaded.
+        '''
+        deferred = []
+        for attr,member in self.members.items():
+            try:
+                member.__get__(self)
+            except AttributeError:
+                deferred.append(attr)
+        return deferred
+
+    def load_deferred(self):
+        '''
+        Loads every deferred column of the instance with a single query.
+        '''
+        attrs = self.deferred()
+        query = statements.select(self.table,tuple(self.fields[attr] for attr in attrs),(("id",False),),'',True)
+        result = reader().query_db(query,{"id" : self.id,"_limit" : 1})
+        if not result:
+            raise AttributeError(f"{self!r} no longer exists")
+        for attr in attrs:
+            setattr(self,attr,result[0][self.fields[attr]])
 
     def __repr__(self):#more readable representation
         return f"<{self.table} obj: id={self.id}>"
@@ -284,8 +1681,11 @@ class MtM:
         for item in items:
             if not isinstance(item,self.right):
                 raise TypeError(f"Item to add must be of type {self.right.__name__}!")
-        query = f"INSERT INTO `{self.middle}` (`{self.left_name}_id`,`{self.right_name}_id`) VALUES {', '.join(f'({self.left.id},{item.id})' for item in items)}"
-        return connectToMySQL(db).query_db(query)
+        query = statements.insert_many(self.middle,(f"{self.left_name}_id",f"{self.right_name}_id"),len(items))
+        result = connectToMySQL(db).query_db(query,[id for item in items for id in (self.left.id,item.id)])
+        mark_write()
+        after_commit(invalidate,self.middle)
+        return result
 
     def remove(self,*items):
         """
@@ -309,15 +1709,57 @@ class MtM:
             if not isinstance(item,self.right):
                 raise TypeError(f"Item to remove must be of type {self.right.__name__}!")
         query = f"DELETE FROM `{self.middle}` WHERE `{self.left_name}_id`={self.left.id} AND `{self.right_name}_id` IN ({', '.join(str(item.id) for item in items)})"
-        return connectToMySQL(db).query_db(query)
+        result = connectToMySQL(db).query_db(query)
+        mark_write()
+        after_commit(invalidate,self.middle)
+        return result
+
+    def select_query(self):
+        return f"SELECT `{self.right_name}`.* FROM `{self.right.table}` AS {self.right_name} JOIN `{self.middle}` ON `{self.right_name}_id` = `{self.right_name}`.id WHERE `{self.left_name}_id`={self.left.id}"
 
     def __retrieve__(self):#custom dunder method, not actually overriding anything here
-        query = f"SELECT `{self.right_name}`.* FROM `{self.right.table}` AS {self.right_name} JOIN `{self.middle}` ON `{self.right_name}_id` = `{self.right_name}`.id WHERE `{self.left_name}_id`={self.left.id}"
-        results = connectToMySQL(db).query_db(query)
+        results = reader().query_db(self.select_query())
         if results:
-            return [self.right(**item) for item in results]
+            make = self.right.constructor(tuple(results[0]))
+            return [make(item) for item in results]
         return []
+
+    def iter(self, batch_size=1000):
+        """
+        Lazily iterates over the relationship without loading the whole collection into memory.
+
+        Example usages:
+        -------------
+            ``for book in my_user.favorites.iter(): ... -> streams every favorite book``
+
+        Parameters
+        ----------
+            batch_size (int): Number of rows fetched from the database at a time.
+
+        Returns
+        -------
+            Generator of instances of the right class.
+        """
+        if isinstance(self._collection,list):
+            yield from self._collection
+            return
+        make = None
+        for item in reader().stream_db(self.select_query(),None,batch_size):
+            make = make or self.right.constructor(tuple(item))
+            yield make(item)
     
+    async def aretrieve(self):
+        """
+        Async counterpart of loading the collection, which is then kept for iteration.
+
+        Example usages:
+        -------------
+            ``books = await my_user.favorites.aretrieve()``
+        """
+        if not isinstance(self._collection,list):
+            self._collection = await asyncio.to_thread(self.__retrieve__)
+        return self._collection
+
     def __repr__(self):#more readable representation
         return f"<MtM obj: table={self.middle}, collection=({', '.join(str(item) for item in self)})>"
 
@@ -341,6 +1783,28 @@ class MtM:
             self._collection = self.__retrieve__()
         return len(self._collection)
 
+def compile_constructor(cls, keys, tuples=False):
+    '''
+    Generates the source of a function creating an instance of cls from a row with the given keys and compiles it.
+
+    Keys the class does not declare as columns are left out of the function.
+    '''
+    lines = ["def make(row):","    inst = new(cls)"]
+    namespace = {"new" : object.__new__,"cls" : cls}
+    for i,key in enumerate(keys):
+        attr = cls.attrs.get(key)
+        if attr is None:
+            continue
+        val = f"row[{i}]" if tuples else f"row[{key!r}]"
+        if attr.isidentifier() and not keyword.iskeyword(attr):
+            lines.append(f"    inst.{attr} = {val}")
+        else:#not a valid name, set through its slot descriptor
+            namespace[f"set{i}"] = cls.setters[key]
+            lines.append(f"    set{i}(inst,{val})")
+    lines.append("    return inst")
+    exec("\n".join(lines),namespace)
+    return namespace["make"]
+
 def table(table):
     '''
     If used without passing any parameters, it will choose a table name based off of the decorated class name (lower-case pluralized)
@@ -359,11 +1823,28 @@ def table(table):
         class Person(Schema):
             pass
 
+    The class must declare its columns. It is recreated with a slot for each of them, so
+    instances only hold their column values and have no __dict__.
     '''
+    def register(cls, name):
+        if not cls.columns:
+            raise TypeError(f"{cls.__name__} must declare the columns of its table")
+        keys = {rel.key for rel in vars(cls).values() if isinstance(rel,belongs_to)}
+        attrs = {col : f"_{col}" if col in keys else col for col in cls.columns}#foreign keys are stored as _key
+        namespace = {key : val for key,val in vars(cls).items() if key not in ("__dict__","__weakref__")}
+        namespace["__slots__"] = tuple(attr for attr in attrs.values() if not any(attr in vars(base) for base in cls.__mro__[1:]))
+        cls = type(cls)(cls.__name__,cls.__bases__,namespace)
+        setattr(cls,"table",name)
+        setattr(cls,"attrs",attrs)
+        setattr(cls,"fields",{attr : col for col,attr in attrs.items()})
+        setattr(cls,"members",{attr : getattr(cls,attr) for attr in cls.fields})
+        setattr(cls,"setters",{col : cls.members[attr].__set__ for col,attr in attrs.items()})
+        setattr(cls,"constructors",{})
+        setattr(cls,"counters",tuple(rel for rel in vars(cls).values() if isinstance(rel,belongs_to) and rel.counter))
+        setattr(cls,"parents",tuple(dict.fromkeys(rel.model for rel in cls.counters)))
+        setattr(cls,"lists",tuple(rows for rows in vars(cls).values() if isinstance(rows,materialized)))
+        Schema.models[cls.__name__] = cls
+        return cls
     if type(table) is str:
-        def inner(cls):
-            setattr(cls,"table",table)
-            return cls
-        return inner
-    setattr(table,"table",table.__name__.lower()+"s")
-    return table
\ No newline at end of file
+        return lambda cls : register(cls,table)
+    return register(table,table.__name__.lower()+"s")
\ No newline at end of file
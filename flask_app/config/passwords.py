@@ -0,0 +1,203 @@
+'''
+Password hashing and verification on a bounded pool of worker processes.
+
+bcrypt is deliberately slow, so hashing on the request thread stalls the worker (and, being
+CPU bound, every other thread of the process) for as long as the hash takes. Here the work is
+handed to a pool of processes so requests only wait on it, and at most max_pending hashes are
+queued at a time: past that, callers wait up to timeout for room and then get PasswordPoolBusy,
+which is answered with a 503 instead of letting a login spike pile up unbounded.
+
+Settings are read from app.config when the pool is first used:
+
+    BCRYPT_LOG_ROUNDS          cost factor of new hashes (default 12), hashes of another cost are upgraded on login
+    PASSWORD_WORKERS           number of worker processes (default: number of CPUs)
+    PASSWORD_MAX_PENDING       hashes queued or running at once before callers wait (default: 4 per worker)
+    PASSWORD_TIMEOUT           seconds to wait for room in the queue and then for the hash (default 10)
+
+Workers are spawned, which imports the main module again in each of them, so it must only
+start the server under if __name__ == "__main__" (as server.py does).
+'''
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask_app import app, bcrypt
+
+class PasswordPoolBusy(Exception):
+    '''
+    Raised when no room opened up in the hashing queue, or no hash came back, before the timeout ran out.
+    '''
+
+def _hash(password, rounds):#runs in a worker process
+    return bcrypt.generate_password_hash(password,rounds).decode("utf-8")
+
+def _check(hashed, password):#runs in a worker process
+    return bcrypt.check_password_hash(hashed,password)
+
+class PasswordPool:
+    def __init__(self, workers=None, max_pending=None, timeout=10):
+        '''
+        A pool of worker processes running bcrypt, with a bounded queue in front of it.
+
+        Workers are spawned rather than forked so they never inherit locks held by the server's threads.
+
+        Attributes:
+        ----------
+            workers (int): Number of worker processes.
+
+            max_pending (int): Hashes queued or running at once before callers wait.
+
+            timeout (float): Seconds to wait for room in the queue and then for the result.
+        '''
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers*4
+        self.timeout = timeout
+        self._executor = self._start()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+
+    def _start(self):
+        return ProcessPoolExecutor(self.workers,mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace(self, broken):
+        '''
+        Swaps a broken executor for a new one, unless another thread already did.
+        '''
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._start()
+        broken.shutdown(wait=False,cancel_futures=True)
+
+    def run(self, func, *args):
+        '''
+        Runs func in a worker process and waits for its result.
+
+        A worker dying (killed for running out of memory, ...) breaks the whole executor: it is
+        replaced and func is run once more on the new one.
+
+        Raises PasswordPoolBusy if the queue stays full, or the result does not come back, within the timeout.
+        '''
+        try:
+            return self._run(func,*args)
+        except BrokenProcessPool:
+            return self._run(func,*args)
+
+    def _run(self, func, *args):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy(f"{self.max_pending} password hashes already pending")
+        with self._lock:
+            self.pending += 1
+        executor = self._executor
+        try:
+            future = executor.submit(func,*args)
+        except BaseException as e:#never submitted, so no callback gives the slot back
+            self._release()
+            if isinstance(e,BrokenProcessPool):
+                self._replace(executor)
+            raise
+        future.add_done_callback(self._done)#the slot is held until the worker is done, even if the caller gave up
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy(f"Password hash took longer than {self.timeout}s") from None
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+        finally:
+            with self._lock:
+                self.busy_time += time.perf_counter()-start
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def _done(self, future):
+        with self._lock:
+            self.completed += 1
+        self._release()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def stats(self):
+        '''
+        Returns a snapshot of the pool's counters.
+
+        Returns
+        -------
+            Dictionary with the worker count, queue bound, hashes pending (queue depth), completed
+            and rejected, and the total/average time callers waited on a hash in seconds.
+        '''
+        with self._lock:
+            return {
+                "workers" : self.workers,
+                "max_pending" : self.max_pending,
+                "pending" : self.pending,
+                "completed" : self.completed,
+                "rejected" : self.rejected,
+                "busy_time" : self.busy_time,
+                "avg_time" : self.busy_time / self.completed if self.completed else 0.0
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    '''
+    Returns the process-wide PasswordPool, creating it from app.config on first use.
+    '''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordPool(app.config.get("PASSWORD_WORKERS"),app.config.get("PASSWORD_MAX_PENDING"),app.config.get("PASSWORD_TIMEOUT",10))
+                atexit.register(_pool.close)
+    return _pool
+
+def rounds():
+    return app.config.get("BCRYPT_LOG_ROUNDS",12)
+
+def hash_password(password):
+    '''
+    Hashes a password with the configured cost factor on the worker pool.
+
+    Example usages:
+    --------------
+        ``User.create(email=email,password=hash_password(request.form['password']))``
+    '''
+    return get_pool().run(_hash,password,rounds())
+
+def check_password(hashed, password):
+    '''
+    Checks a password against its hash on the worker pool.
+    '''
+    return get_pool().run(_check,hashed,password)
+
+def needs_rehash(hashed):
+    '''
+    Whether a hash was made with a cost factor other than the configured one and should be replaced on the next successful login.
+    '''
+    if isinstance(hashed,bytes):
+        hashed = hashed.decode("utf-8")
+    try:
+        return int(hashed.split("$")[2]) != rounds()
+    except (IndexError,ValueError):#not a bcrypt hash
+        return True
+
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    return "Too many sign-ins at once, please try again in a moment.", 503, {"Retry-After" : "1"}
@@ -0,0 +1,82 @@
+'''
+HTTP caching of rendered pages: ETags answered with 304 Not Modified, and a cache of rendered fragments.
+
+A page's ETag is built from the version stamps of the rows it shows (id and updated_at, along
+with the other values it displays) and the write generation of their tables, so a browser asking
+again with If-None-Match gets a 304 without the page being rendered when nothing on it changed.
+Fragments rendered for a row are kept under the row's stamps and, like cached queries, dropped by
+every write the ORM makes to their tables, so the create/update/delete endpoints invalidate both.
+'''
+import hashlib
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+from flask_app.config.cache import QueryCache
+
+fragments = QueryCache(ttl=300,maxsize=50_000)#rendered markup, dropped on writes like cached queries
+
+def etag(tables, *parts):
+    '''
+    Returns the ETag of a page showing rows of the given tables.
+
+    Example usages:
+    --------------
+        ``etag(("questions","users"),(question.id,question.updated_at,question.asker.username))``
+
+    Parameters
+    ----------
+        tables (tuple): Tables the page reads from, whose write generation is part of the tag.
+
+        parts (*tuple): Version stamps of the rows shown, and anything else the page depends on.
+        The logged in user and the query string are always part of the tag.
+    '''
+    key = repr((session.get("id"),request.full_path,fragments.generation(*tables),parts))
+    return hashlib.blake2b(key.encode(),digest_size=16).hexdigest()
+
+def not_modified(tag):
+    '''
+    Returns a 304 response if the browser already holds the page with the given ETag, or None if the page has to be rendered.
+
+    Pages with flashed messages waiting are always rendered, since showing them is what clears them.
+    '''
+    if "_flashes" in session or not request.if_none_match.contains_weak(tag):
+        return None
+    return tagged(("",304),tag)
+
+def tagged(response, tag):
+    '''
+    Adds the ETag to a response, asking browsers to revalidate the (per user) page every time before reusing it.
+    '''
+    response = make_response(response)
+    response.set_etag(tag,weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def fragment(template, tables, key, **context):
+    '''
+    Renders a template, reusing the markup rendered earlier under the same key.
+
+    Example usages:
+    --------------
+        ``fragment("_question_row.html",("questions","users"),(question.id,question.updated_at),question=question)``
+
+    Parameters
+    ----------
+        template (str): Template of the fragment.
+
+        tables (tuple): Tables the fragment shows rows of, any write to them drops it.
+
+        key (tuple): Version stamps of the rows shown and anything else the markup depends on.
+
+        context (**str): Variables passed to the template.
+
+    Returns
+    -------
+        Markup of the fragment, to be inserted into a page unescaped.
+    '''
+    found = fragments.get((template,key))
+    if found is not None:
+        return Markup(found[0])
+    generation = fragments.generation(*tables)
+    markup = render_template(template,**context)
+    fragments.set((template,key),(markup,),tables,generation)
+    return Markup(markup)
@@ -0,0 +1,308 @@
+'''
+Server-side sessions: the cookie only holds a random session id, the session itself is kept in a store.
+
+Flask's default sessions serialize, sign and send the whole session (flashed messages included)
+in the cookie of every response that changes it, and verify and deserialize it again on every
+request. Here the cookie stays the same size whatever the session holds, nothing is signed, and
+a session is only read from the store by requests that use it.
+
+The store is chosen by SESSION_STORE in the app's config:
+
+    unset                        -> sessions.sqlite3 in the app's instance folder, as below
+    "sqlite:///path/sessions.db" -> SQLite file shared by the processes of one machine, behind an in-process LRU
+    "redis://host:6379/0"        -> Redis or a compatible server (needs the redis package), behind an in-process LRU
+    "memory"                     -> in-process LRU only (lost on restart, not shared between processes: one process only)
+
+Unlike signed cookies, sessions live on the server: several workers on one machine share them
+through the default SQLite file, workers on several machines need Redis.
+
+SESSION_MEMORY_SIZE caps the sessions held by the LRU (10,000 unless set). Sessions expire
+PERMANENT_SESSION_LIFETIME after they were last written. The cookie also carries the number of
+times its session was written, so the LRU can tell when another process wrote a newer version.
+'''
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+serializer = TaggedJSONSerializer()#the same as cookie sessions, keeps Markup, tuples, bytes and datetimes
+COOKIE = re.compile(r"([A-Za-z0-9_-]{43})\.(\d{1,12})")#session id, then version
+
+class MemoryStore:
+    def __init__(self, maxsize=10_000):
+        '''
+        A process-wide, thread-safe LRU of serialized sessions by id, each expiring after its time to live.
+
+        Attributes:
+        ----------
+            maxsize (int): Maximum number of sessions held, the least recently used are dropped first.
+        '''
+        self.maxsize = maxsize
+        self._entries = OrderedDict()#sid -> (version, payload, expires)
+        self._lock = threading.Lock()
+
+    def get(self, sid, version=None):
+        '''
+        Returns the (version, payload) of the session, or None if it is missing or expired.
+        '''
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry[:2]
+
+    def set(self, sid, version, payload, ttl):
+        with self._lock:
+            self._entries[sid] = (version,payload,time.time()+ttl)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid,None)
+
+class SQLiteStore:
+    def __init__(self, path):
+        '''
+        Sessions kept in a table of the SQLite file at path, with one connection per thread.
+
+        Expired sessions are skipped when read and deleted every thousand writes.
+        '''
+        self.path = path
+        self.writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local,"connection",None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path,timeout=10,isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")#readers do not wait on writers
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL, expires REAL NOT NULL)")
+        return connection
+
+    def get(self, sid, version=None):
+        row = self._connection().execute("SELECT version, data FROM sessions WHERE sid = ? AND expires > ?",(sid,time.time())).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, sid, version, payload, ttl):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO sessions (sid, version, data, expires) VALUES (?, ?, ?, ?)",(sid,version,payload,time.time()+ttl))
+        self.writes += 1
+        if self.writes % 1000 == 0:
+            connection.execute("DELETE FROM sessions WHERE expires <= ?",(time.time(),))
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?",(sid,))
+
+class RedisStore:
+    def __init__(self, url):
+        '''
+        Sessions kept under session:<id> keys of the Redis (or compatible) server at url, expired by the server.
+        '''
+        import redis#only needed for this store
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, sid, version=None):
+        found = self.client.get(f"session:{sid}")
+        if found is None:
+            return None
+        version,_,payload = found.decode().partition(":")
+        return int(version),payload
+
+    def set(self, sid, version, payload, ttl):
+        self.client.set(f"session:{sid}",f"{version}:{payload}",ex=max(int(ttl),1))
+
+    def delete(self, sid):
+        self.client.delete(f"session:{sid}")
+
+class TieredStore:
+    def __init__(self, front, back, ttl):
+        '''
+        A shared store (back) behind an in-process one (front) answering for it while the version in the cookie matches.
+
+        Attributes:
+        ----------
+            ttl (float): Seconds sessions read from the back store are kept in the front one.
+        '''
+        self.front = front
+        self.back = back
+        self.ttl = ttl
+
+    def get(self, sid, version=None):
+        found = self.front.get(sid)
+        if found is not None and found[0] == version:
+            return found
+        found = self.back.get(sid)#written by another process since, or never seen by this one
+        if found is not None:
+            self.front.set(sid,*found,self.ttl)
+        return found
+
+    def set(self, sid, version, payload, ttl):
+        self.back.set(sid,version,payload,ttl)
+        self.front.set(sid,version,payload,ttl)
+
+    def delete(self, sid):
+        self.back.delete(sid)
+        self.front.delete(sid)
+
+def open_store(url, maxsize=10_000, ttl=31*24*3600):
+    '''
+    Returns the store for a SESSION_STORE setting, see the module's docstring.
+
+    Raises
+    ------
+        ValueError for settings naming no known store.
+    '''
+    if url == "memory":
+        return MemoryStore(maxsize)
+    if url.startswith("sqlite:///"):
+        return TieredStore(MemoryStore(maxsize),SQLiteStore(url[len("sqlite:///"):]),ttl)
+    if url.startswith(("redis://","rediss://","unix://")):
+        return TieredStore(MemoryStore(maxsize),RedisStore(url),ttl)
+    raise ValueError(f"Unknown SESSION_STORE {url!r}, expected memory, sqlite:///path or redis://host")
+
+class ServerSession(SessionMixin):
+    def __init__(self, store, sid=None, version=0):
+        '''
+        A session whose values are only read from the store the first time they are used.
+
+        Attributes:
+        ----------
+            sid (str): Random id of the session, None until a new session is saved.
+
+            version (int): Number of times the session was written.
+
+            modified (bool): Whether the session was changed during the request and must be saved.
+
+            accessed (bool): Whether the session was used during the request.
+
+            stale (str): Id given up by regenerate, deleted when the session is saved.
+        '''
+        self.store = store
+        self.sid = sid
+        self.version = version
+        self.modified = False
+        self.accessed = False
+        self.stale = None
+        self._data = None
+
+    @property
+    def new(self):
+        return self.sid is None
+
+    @property
+    def data(self):
+        if self._data is None:
+            found = self.store.get(self.sid,self.version) if self.sid else None
+            if found is None:#expired, or an id this server never gave out
+                self.sid,self.version,self._data = None,0,{}
+            else:
+                self.version,self._data = found[0],serializer.loads(found[1])
+        self.accessed = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, val):
+        self.data[key] = val
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key,default)
+
+    def clear(self):
+        if self.data:
+            self.data.clear()
+            self.modified = True
+
+    def regenerate(self):
+        '''
+        Moves the session to a new id, so an id known to anyone before logging in is of no use after.
+
+        Example usages:
+        --------------
+            ``session.regenerate(); session['id'] = user.id``
+        '''
+        self.data
+        self.stale = self.stale or self.sid
+        self.sid = None
+        self.modified = True
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self):
+        '''
+        Flask session interface keeping sessions in the store set by SESSION_STORE (a SQLite file in the
+        instance folder if unset), opened on the first request.
+
+        Example usages:
+        --------------
+            ``app.session_interface = ServerSessionInterface()``
+        '''
+        self.store = None
+        self._lock = threading.Lock()
+
+    def open_store(self, app):
+        if self.store is None:
+            with self._lock:
+                if self.store is None:
+                    url = app.config.get("SESSION_STORE") or f"sqlite:///{os.path.join(app.instance_path,'sessions.sqlite3')}"
+                    self.store = open_store(url,app.config.get("SESSION_MEMORY_SIZE",10_000),app.permanent_session_lifetime.total_seconds())
+        return self.store
+
+    def open_session(self, app, request):
+        found = COOKIE.fullmatch(request.cookies.get(self.get_cookie_name(app),""))
+        if found is None:
+            return ServerSession(self.open_store(app))
+        return ServerSession(self.open_store(app),found.group(1),int(found.group(2)))
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.modified:#the cookie already points at the stored session
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        partitioned = self.get_cookie_partitioned(app)
+        if session.stale:
+            session.store.delete(session.stale)
+        if not session:
+            if session.sid:
+                session.store.delete(session.sid)
+            if session.sid or session.stale:
+                response.delete_cookie(name,domain=domain,path=path,secure=secure,partitioned=partitioned,samesite=samesite,httponly=httponly)
+            return
+        session.sid = session.sid or secrets.token_urlsafe(32)
+        session.version += 1
+        session.store.set(session.sid,session.version,serializer.dumps(session.data),app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(name,f"{session.sid}.{session.version}",expires=self.get_expiration_time(app,session),httponly=httponly,
+                            domain=domain,path=path,secure=secure,partitioned=partitioned,samesite=samesite)
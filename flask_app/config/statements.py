@@ -0,0 +1,182 @@
+'''
+Builders for the SQL statements issued by Schema.
+
+Every builder only depends on the shape of a query (table, columns, filter
+columns, ordering) and never on the values, which are always passed as
+parameters. That lets each shape be assembled once and reused from the
+lru_cache on every later call.
+
+Each shape is also recorded in shapes the first time it is built, which is what
+the index advisor (see indexes.py) reads to know which columns are filtered on.
+'''
+import re
+from functools import lru_cache
+
+shapes = {}#(table, equality columns, order columns) -> (example query, columns matched with IN)
+
+def observe(table, query, filters, order=()):
+    '''
+    Records the columns a query filters and sorts on for the index advisor. Called once per shape, when the statement is built.
+    '''
+    key = (table,tuple(col for col,many in filters or ()),tuple(order))
+    shapes.setdefault(key,(query,tuple(col for col,many in filters or () if many)))
+
+def shape(data):
+    '''
+    Returns the hashable shape of a set of filters: each column name along with whether it is matched with IN.
+
+    List, set and tuple values in data are turned into tuples in place so they are escaped as IN lists.
+    Returns None if one of them is empty, since nothing can match an empty IN.
+    '''
+    filters = []
+    for col,val in data.items():
+        many = isinstance(val,(list,tuple,set,frozenset))
+        if many:
+            val = data[col] = tuple(val)
+            if not val:
+                return None
+        filters.append((col,many))
+    return tuple(filters)
+
+def projection(columns):
+    '''
+    Builds the column list of a SELECT, always including id. None selects every column.
+    '''
+    if columns is None:
+        return '*'
+    return ', '.join(f'`{col}`' for col in dict.fromkeys(('id',*columns)))
+
+def source(table, columns, joined):
+    '''
+    Builds what comes between SELECT and WHERE: the column list and the table, or the JOINs of a Join plan.
+    '''
+    if joined is None:
+        return f"{projection(columns)} FROM `{table}`"
+    return f"{joined.columns} FROM {joined.source}"
+
+@lru_cache(maxsize=1024)
+def conditions(filters, alias=''):
+    '''
+    WHERE clause for the given filter shape, with every column qualified by alias if given.
+    '''
+    if not filters:
+        return ''
+    prefix = f"{alias}." if alias else ''
+    return 'WHERE '+' AND '.join(f'{prefix}`{col}` IN %({col})s' if many else f'{prefix}`{col}`=%({col})s' for col,many in filters)
+
+@lru_cache(maxsize=1024)
+def order(col, desc, rand, alias=''):
+    '''
+    ORDER BY clause sorting on col, or in random order if rand, with col qualified by alias if given.
+    '''
+    if rand:
+        return 'ORDER BY RAND()'
+    prefix = f"{alias}." if alias else ''
+    return f"ORDER BY {prefix}`{col}` {'DESC' if desc else 'ASC'}"
+
+@lru_cache(maxsize=1024)
+def select(table, columns, filters, order='', limit=False, offset=False, joined=None, lock=False):
+    '''
+    SELECT statement for the given shape. Limit and offset are passed as the _limit and _offset parameters.
+
+    If joined is a Join plan, the belongs_to relationships it covers are selected along with the rows.
+    If lock, the rows are locked with FOR UPDATE until the end of the transaction.
+    '''
+    query = f"SELECT {source(table,columns,joined)} {conditions(filters,joined and joined.alias)} {order}"
+    if limit:
+        query += f" LIMIT %(_limit)s{' OFFSET %(_offset)s' if offset else ''}"
+    if lock:
+        query += " FOR UPDATE"
+    observe(table,query,filters,re.findall(r"`(\w+)`",order))
+    return query
+
+@lru_cache(maxsize=1024)
+def seek(table, columns, filters, col, desc, after, joined=None):
+    '''
+    Keyset pagination SELECT, seeking past the _after (and _after_id) parameters on col. Limited by the _limit parameter.
+    '''
+    alias = joined and joined.alias
+    prefix = f"{alias}." if alias else ''
+    clauses = [conditions(filters,alias)[len('WHERE '):]] if filters else []
+    op = '<' if desc else '>'
+    if after and col == "id":
+        clauses.append(f"{prefix}`id` {op} %(_after)s")
+    elif after:
+        clauses.append(f"({prefix}`{col}` {op} %(_after)s OR ({prefix}`{col}` = %(_after)s AND {prefix}`id` {op} %(_after_id)s))")
+    direction = 'DESC' if desc else 'ASC'
+    order = f"{prefix}`id` {direction}" if col == "id" else f"{prefix}`{col}` {direction}, {prefix}`id` {direction}"
+    query = f"SELECT {source(table,columns,joined)} {'WHERE '+' AND '.join(clauses) if clauses else ''} ORDER BY {order} LIMIT %(_limit)s"
+    observe(table,query,filters,(col,))
+    return query
+
+@lru_cache(maxsize=1024)
+def search(table, columns, fulltext, filters):
+    '''
+    Full-text SELECT matching the _text parameter against the fulltext columns, best matches first.
+
+    Needs a FULLTEXT index on exactly those columns. Limited by the _limit and _offset parameters.
+    '''
+    match = f"MATCH ({', '.join(f'`{col}`' for col in fulltext)}) AGAINST (%(_text)s IN NATURAL LANGUAGE MODE)"
+    clauses = [match,*([conditions(filters)[len('WHERE '):]] if filters else [])]
+    query = f"SELECT {projection(columns)}, {match} AS `_score` FROM `{table}` WHERE {' AND '.join(clauses)} ORDER BY `_score` DESC, `id` DESC LIMIT %(_limit)s OFFSET %(_offset)s"
+    observe(table,query,filters)
+    return query
+
+@lru_cache(maxsize=1024)
+def insert(table, columns):
+    return f"INSERT INTO `{table}` ({', '.join(f'`{col}`' for col in columns)}) VALUES ({', '.join(f'%({col})s' for col in columns)})"
+
+@lru_cache(maxsize=1024)
+def insert_many(table, columns, rows):
+    '''
+    Multi-row INSERT statement for the given number of rows, taking the values of every row in order as positional parameters.
+    '''
+    row = f"({', '.join(['%s']*len(columns))})"
+    return f"INSERT INTO `{table}` ({', '.join(f'`{col}`' for col in columns)}) VALUES {', '.join([row]*rows)}"
+
+def chunks(rows, max_bytes, max_rows=1000):
+    '''
+    Splits rows (tuples of values) into lists whose escaped size should stay under max_bytes.
+
+    The size of each value is estimated on the high side (every character of a string
+    escaped) so a chunk never exceeds the limit once the driver has escaped it.
+    '''
+    chunk,size = [],0
+    for row in rows:
+        row_size = sum(2*len(val)+4 if isinstance(val,(str,bytes)) else len(str(val))+2 for val in row)+4
+        if chunk and (size+row_size > max_bytes or len(chunk) >= max_rows):
+            yield chunk
+            chunk,size = [],0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+@lru_cache(maxsize=1024)
+def update(table, columns, by_id):
+    '''
+    UPDATE statement for the given columns, limited to the row whose id is in the _id parameter if by_id.
+    '''
+    return f"UPDATE `{table}` SET {', '.join(f'`{col}`=%({col})s' for col in columns)} {'WHERE `id`=%(_id)s' if by_id else ''}"
+
+@lru_cache(maxsize=1024)
+def increment(table, column, untouched=()):
+    '''
+    UPDATE statement adding the _by parameter to a counter column of the row whose id is in the id parameter.
+
+    Columns in untouched are set to themselves, which keeps ON UPDATE columns such as updated_at from changing.
+    '''
+    return f"UPDATE `{table}` SET `{column}` = `{column}` + %(_by)s{''.join(f', `{col}` = `{col}`' for col in untouched)} WHERE `id`=%(id)s"
+
+@lru_cache(maxsize=1024)
+def update_many(table, columns):
+    '''
+    UPDATE statement for the given columns, limited to the rows whose ids are in the _ids parameter.
+    '''
+    return f"UPDATE `{table}` SET {', '.join(f'`{col}`=%({col})s' for col in columns)} WHERE `id` IN %(_ids)s"
+
+@lru_cache(maxsize=1024)
+def delete(table, filters):
+    query = f"DELETE FROM `{table}` WHERE {' AND '.join(f'`{col}` IN %({col})s' if many else f'`{col}`=%({col})s' for col,many in filters)}"
+    observe(table,query,filters)
+    return query
@@ -1,7 +1,8 @@
-from flask import redirect, request, render_template, session
+from flask import redirect, request, session
 from flask_app import app
 from flask_app.models.question_model import Question
 from flask_app.models.answer_model import Answer
+from flask_app.config.orm import atomic
 
 #----------------------Action-------------------------#
 @app.post('/questions/<int:id>/answer')
@@ -16,13 +17,17 @@ def create_answer(id):
         return redirect(f'/questions/{id}')
     return redirect('/')
 
+@atomic
+def approve(qid,aid,user_id):#both rows change in one commit, concurrent approvals of the question wait on its lock
+    question = Question.retrieve_one(id=qid,lock=True)
+    if question and user_id == question._asker_id and not question.answered:
+        question.update(answered=True)
+        Answer.update(id=aid,selected=True)
+
 @app.get('/questions/<int:qid>/approve-answer/<int:aid>')
 def approve_answer(qid,aid):
     if 'id' in session:
-        question = Question.retrieve_one(id=qid)
-        if session['id'] == question._asker_id and not question.answered:
-            question.update(answered=True)
-            Answer.retrieve_one(id=aid).update(selected=True)
+        approve(qid,aid,session['id'])
         return redirect(f'/questions/{qid}')
     return redirect('/')
 
@@ -1,6 +1,7 @@
 from flask import redirect, request, render_template, session
 from flask_app.models.user_model import User
-from flask_app import app,bcrypt
+from flask_app.config.passwords import hash_password, needs_rehash
+from flask_app import app
 
 #----------------Display-----------------#
 @app.get('/')
@@ -10,18 +11,24 @@ def index():
 @app.post('/users/register')
 def register_user():
     if User.validate(**request.form):
+        session.regenerate()#a new session id once logged in
         session['id'] = User.create(
             username=request.form['username'],
             email=request.form['email'],
-            password=bcrypt.generate_password_hash(request.form['password'])
+            password=hash_password(request.form['password'])
         )
         return redirect('/dashboard')
     return redirect('/')
 
 @app.post('/users/login')
 def login_user():
-    if User.validate(**request.form):
-        session['id'] = User.retrieve_one(email=request.form['login_email']).id
+    validation = User.validate(**request.form)
+    user = validation.context.get("user")#None if the form left out the login fields, so no validator ran
+    if validation and user:
+        session.regenerate()#a new session id once logged in
+        session['id'] = user.id#loaded while validating, no need to query again
+        if needs_rehash(user.password):#cost factor changed since the hash was made
+            user.update(password=hash_password(request.form['login_password']))
         return redirect('/dashboard')
     return redirect('/')
 
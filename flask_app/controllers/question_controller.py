@@ -1,18 +1,73 @@
+import asyncio
 from flask import redirect, request, render_template, session
 from flask_app import app
 from flask_app.models.user_model import User
 from flask_app.models.question_model import Question
+from flask_app.config.orm import Collection
+from flask_app.config.responses import etag, fragment, not_modified, tagged
+
+PAGE_SIZE = 25
+LIST_COLUMNS = ("question","asker_id","answer_count","created_at","updated_at")#everything the dashboard shows, skips description
+
+#----------------------Fragments-------------------------#
+@app.template_global()
+def question_row(question, date):
+    return fragment("_question_row.html",("questions","users"),(question.id,question.updated_at,question.answer_count,question.asker.username,date),question=question,date=date)
+
+@app.template_global()
+def answer_block(question, answer, logged_user):
+    if answer._answerer_id == logged_user.id:
+        action = "delete"
+    elif question._asker_id == logged_user.id and not question.answered:
+        action = "approve"
+    else:
+        action = None
+    return fragment("_answer.html",("answers","users"),(answer.id,answer.updated_at,answer.answerer.username,question.id,action),question=question,answer=answer,action=action)
 
 #----------------------Display-------------------------#
 @app.get('/dashboard')
-def dashboard():
+async def dashboard():
     if "id" in session:
+        logged_user, answered, unanswered = await asyncio.gather(
+            User.aretrieve_one(id=session['id']),
+            Question.recent_answered.apage(PAGE_SIZE,request.args.get('answered'),columns=LIST_COLUMNS),
+            Question.recent_unanswered.apage(PAGE_SIZE,request.args.get('unanswered'),columns=LIST_COLUMNS)
+        )
+        if not logged_user:#the session outlived its user
+            return redirect('/users/logout')
+        Collection(answered+unanswered).with_related("asker")#one query for both lists
+        tag = etag(
+            ("questions","users"),
+            (logged_user.id,logged_user.username),
+            answered.cursor,unanswered.cursor,
+            *((question.id,question.updated_at,question.answer_count,question.asker.username) for question in answered+unanswered)
+        )
+        cached = not_modified(tag)
+        if cached:
+            return cached
         context = {
-            'logged_user' : User.retrieve_one(id=session['id']),
-            'answered_questions' : Question.retrieve_all(answered=1),
-            'unanswered_questions' : Question.retrieve_all(answered=0)
+            'logged_user' : logged_user,
+            'answered_questions' : answered,
+            'unanswered_questions' : unanswered
         }
-        return render_template('dashboard.html', **context)
+        return tagged(render_template('dashboard.html', **context),tag)
+    return redirect('/')
+
+@app.get('/questions/search')
+async def search_questions():
+    if "id" in session:
+        text = request.args.get('q','')
+        logged_user, results = await asyncio.gather(
+            User.aretrieve_one(id=session['id']),
+            Question.asearch(text,PAGE_SIZE,request.args.get('after'),columns=LIST_COLUMNS)
+        )
+        await results.awith_related("asker")
+        context = {
+            'logged_user' : logged_user,
+            'text' : text,
+            'results' : results
+        }
+        return render_template('search.html',**context)
     return redirect('/')
 
 @app.get('/questions/ask')
@@ -22,13 +77,38 @@ def ask_question():
     return redirect('/')
 
 @app.get('/questions/<int:id>')
-def view_question(id):
+async def view_question(id):
     if "id" in session:
+        logged_user, question = await asyncio.gather(
+            User.aretrieve_one(id=session['id']),
+            Question.aretrieve_one(id=id,join=("asker",))
+        )
+        if not logged_user:#the session outlived its user
+            return redirect('/users/logout')
+        answers = []
+        if question:
+            answers, _ = await asyncio.gather(
+                Question.answers.apage(question,PAGE_SIZE,request.args.get('after'),join=("answerer",)),
+                question.ajoin("selected_answer.answerer")
+            )
+        selected = question and question.selected_answer
+        tag = etag(
+            ("questions","answers","users"),
+            (logged_user.id,logged_user.username),
+            question and (question.id,question.updated_at,question.asker.username),
+            selected and (selected.id,selected.updated_at,selected.answerer.username),
+            getattr(answers,"cursor",None),
+            *((answer.id,answer.updated_at,answer.answerer.username) for answer in answers)
+        )
+        cached = not_modified(tag)
+        if cached:
+            return cached
         context = {
-            'logged_user' : User.retrieve_one(id=session['id']),
-            'question' : Question.retrieve_one(id=id)
+            'logged_user' : logged_user,
+            'question' : question,
+            'answers' : answers
         }
-        return render_template('view_question.html',**context)
+        return tagged(render_template('view_question.html',**context),tag)
     return redirect('/')
 
 @app.get('/questions/<int:id>/edit')
@@ -1,23 +1,10 @@
-from flask_app.config.orm import Schema,table
+from flask_app.config.orm import Schema,table,belongs_to
 
 @table
 class Answer(Schema):
-    def __init__(self, **data):
-        self.id = data['id']
-        self.answer = data['answer']
-        self.selected = data['selected']
-        self._answerer_id = data['answerer_id']
-        self._question_id = data['question_id']
-        self.created_at = data['created_at']
-        self.updated_at = data['updated_at']
-
-    @property
-    def question(self):
-        return Question.retrieve_one(id=self._question_id)
-
-    @property
-    def answerer(self):
-        return User.retrieve_one(id=self._answerer_id)
+    columns = ("id","answer","selected","answerer_id","question_id","created_at","updated_at")
+    question = belongs_to("Question","question_id",counter="answer_count")
+    answerer = belongs_to("User","answerer_id",columns=("username",),counter="answer_count")
 
 @Answer.validator("Answer must be at least 20 characters")
 def answer(val):
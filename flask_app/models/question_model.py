@@ -1,27 +1,16 @@
-from flask_app.config.orm import Schema,table
+from flask_app.config.cache import cached
+from flask_app.config.orm import Schema,table,belongs_to,has_many,has_one,materialized
 
+@cached(ttl=30,maxsize=10_000)
 @table
 class Question(Schema):
-    def __init__(self, **data):
-        self.id = data['id']
-        self.question = data["question"]
-        self.description = data["description"]
-        self.answered = data["answered"]
-        self._asker_id = data["asker_id"]
-        self.created_at = data['created_at']
-        self.updated_at = data['updated_at']
-
-    @property
-    def asker(self):
-        return User.retrieve_one(id=self._asker_id)
-
-    @property
-    def answers(self):
-        return Answer.retrieve_all(question_id=self.id,selected=False)
-    
-    @property
-    def selected_answer(self):
-        return Answer.retrieve_one(question_id=self.id,selected=True)
+    columns = ("id","question","description","answered","asker_id","answer_count","created_at","updated_at")
+    fulltext = ("question","description")
+    asker = belongs_to("User","asker_id",columns=("username",),counter="question_count")
+    answers = has_many("Answer","question_id",selected=False)
+    selected_answer = has_one("Answer","question_id",selected=True)
+    recent_unanswered = materialized(answered=0)
+    recent_answered = materialized(answered=1)
 
 @Question.validator("Question must be at least 20 characters")
 def question(val):
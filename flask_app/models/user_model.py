@@ -1,24 +1,14 @@
-from flask_app import bcrypt
-from flask_app.config.orm import Schema,table
+from flask_app.config.cache import cached
+from flask_app.config.passwords import check_password
+from flask_app.config.orm import Schema,table,has_many
 import re
 
+@cached(ttl=30,maxsize=10_000)
 @table
 class User(Schema):
-    def __init__(self, **data):
-        self.id = data['id']
-        self.username = data['username']
-        self.email = data['email']
-        self.password = data['password']
-        self.created_at = data['created_at']
-        self.updated_at = data['updated_at']
-
-    @property
-    def questions(self):
-        return Question.retrieve_all(asker_id=self.id)
-
-    @property
-    def answers(self):
-        return Answer.retrieve_all(answerer_id=self.id)
+    columns = ("id","username","email","password","question_count","answer_count","created_at","updated_at")
+    questions = has_many("Question","asker_id")
+    answers = has_many("Answer","answerer_id")
 
 @User.validator("Username name must be at least 5 characters!")
 def username(val):
@@ -29,8 +19,8 @@ def email(val):
     return re.compile(r'^[a-zA-Z0-9.+_-]+@[a-zA-Z0-9._-]+\.[a-zA-Z]+$').match(val)
 
 @User.validator("Email is already in use!")
-def email(val):
-    return not bool(User.retrieve_one(email=val))
+def email(val,context):
+    return not bool(context.load("user",lambda : User.retrieve_one(email=val)))
 
 @User.validator("Password must be at least 8 characters!")
 def password(val):
@@ -41,13 +31,13 @@ def confirm_password(val,match):
     return val == match
 
 @User.validator("Invalid Email!")
-def login_email(val):
-    return bool(User.retrieve_one(email=val))
+def login_email(val,context):
+    return bool(context.load("user",lambda : User.retrieve_one(email=val)))
 
 @User.validator("Invalid Password!",email="login_email")
-def login_password(val,email):
-    user = User.retrieve_one(email=email)
-    return user and bcrypt.check_password_hash(user.password,val)
+def login_password(val,email,context):
+    user = context.load("user",lambda : User.retrieve_one(email=email))
+    return user and check_password(user.password,val)
 
 from flask_app.models.question_model import Question
 from flask_app.models.answer_model import Answer
\ No newline at end of file
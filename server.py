@@ -1,5 +1,6 @@
 from flask_app import app
 from flask_app.controllers import  login_controller, question_controller, answer_controller
+from flask_app.config import aggregates, indexes
 
 if __name__=="__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,21 @@
+from functools import partial
+import pytest
+from flask_app import app, db
+from flask_app.config.cache import caches
+from flask_app.config.mysqlconnection import configure_pool, get_pool
+from benchmarks import seed, standin
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    '''
+    Runs each test against a freshly seeded SQLite stand-in, see benchmarks/standin.py.
+    '''
+    configure_pool(db,connect=partial(standin.connect,str(tmp_path/"qa.sqlite3")))
+    app.config["SESSION_STORE"] = f"sqlite:///{tmp_path/'sessions.sqlite3'}"
+    app.session_interface.store = None#opened again with the setting above
+    for cache in caches:
+        cache.clear()
+    seed.reset("sqlite")
+    seed.seed(20,"x")
+    yield
+    get_pool(db).close()
@@ -0,0 +1,41 @@
+from flask_app import db
+from flask_app.config.mysqlconnection import connectToMySQL, get_pool, hooks
+from flask_app.models.answer_model import Answer
+
+def answer_count(id):
+    return connectToMySQL(db).query_db("SELECT answer_count FROM questions WHERE id=%(id)s",{"id" : id})[0]["answer_count"]
+
+def test_update_moves_counter():
+    id = Answer.create(answer="moving",answerer_id=1,question_id=1)
+    before = answer_count(1),answer_count(2)
+    Answer.update(id,question_id=2)
+    assert (answer_count(1),answer_count(2)) == (before[0]-1,before[1]+1)
+
+def test_update_of_missing_row_moves_nothing():
+    before = answer_count(2)
+    Answer.update(10_000,question_id=2)
+    assert answer_count(2) == before
+
+def test_bulk_update_moves_counters():
+    ids = Answer.bulk_create([{"answer" : "moving","answerer_id" : 1,"question_id" : 1}]*3)
+    before = answer_count(1),answer_count(2)
+    assert Answer.bulk_update(ids+[10_000],question_id=2) == 3
+    assert (answer_count(1),answer_count(2)) == (before[0]-3,before[1]+3)
+
+def test_bulk_delete_moves_counters():
+    ids = Answer.bulk_create([{"answer" : "deleted","answerer_id" : 1,"question_id" : 1}]*3)
+    before = answer_count(1)
+    Answer.bulk_delete(ids)
+    assert answer_count(1) == before-3
+
+def test_bulk_create_without_ids_uses_multi_row_inserts():
+    get_pool(db).auto_increment = (1,False)#interleaved lock mode
+    queries = []
+    hooks.append(lambda event : queries.append(event.query))
+    try:
+        before = answer_count(1)
+        assert Answer.bulk_create([{"answer" : "imported","answerer_id" : 1,"question_id" : 1}]*3,returning=False) == 3
+    finally:
+        hooks.pop()
+    assert sum(query.startswith("INSERT") for query in queries) == 1
+    assert answer_count(1) == before+3
@@ -0,0 +1,6 @@
+import server#registers the routes
+from flask_app import app
+
+def test_login_without_credentials_redirects():
+    response = app.test_client().post('/users/login',data={})
+    assert response.status_code == 302 and response.location == '/'
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+import server#registers the routes
+from flask_app import app
+from flask_app.config.orm import identity_map
+from flask_app.models.question_model import Question
+
+def test_instance_methods_pass_own_id():
+    question = Question.retrieve_one(id=1)
+    question.update(question="Has this question been renamed yet?")
+    assert Question.retrieve_one(id=1).question == "Has this question been renamed yet?"
+
+def test_instance_methods_refuse_another_id():
+    question,other = Question.retrieve_one(id=1),Question.retrieve_one(id=2)
+    for call in (lambda : question.update(id=2,question="Overwritten by somebody else?"),lambda : question.delete(id=2)):
+        with pytest.raises(TypeError):
+            call()
+    with pytest.raises(TypeError):
+        asyncio.run(question.aupdate(id=2,question="Overwritten by somebody else?"))
+    with pytest.raises(TypeError):
+        asyncio.run(question.adelete(id=2))
+    assert Question.retrieve_one(id=2).question == other.question
+
+def test_update_form_cannot_target_another_question():
+    question,other = Question.retrieve_one(id=1),Question.retrieve_one(id=2)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['id'] = question._asker_id
+    response = client.post('/questions/1/update',data={"id" : 2,"question" : "Overwritten by somebody else?","description" : "x"})
+    assert Question.retrieve_one(id=2).question == other.question
+    assert response.status_code == 500#the TypeError
+
+def test_identity_map_only_lives_for_a_request():
+    with app.app_context():#as a CLI command or a worker keeps one open
+        Question.retrieve_one(id=1)
+        assert identity_map() is None
+    with app.test_request_context():
+        question = Question.retrieve_one(id=1)
+        assert Question.retrieve_one(id=1) is question
+        assert identity_map()
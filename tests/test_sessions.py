@@ -0,0 +1,17 @@
+from flask_app import app
+from flask_app.config.sessions import ServerSessionInterface, SQLiteStore, TieredStore
+
+def test_default_store_is_sqlite_in_instance_folder(monkeypatch, tmp_path):
+    monkeypatch.delitem(app.config,"SESSION_STORE")
+    monkeypatch.setattr(app,"instance_path",str(tmp_path))
+    store = ServerSessionInterface().open_store(app)
+    assert isinstance(store,TieredStore) and isinstance(store.back,SQLiteStore)
+    assert store.back.path == str(tmp_path/"sessions.sqlite3")
+
+def test_sessions_outlive_the_process():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['id'] = 1
+    app.session_interface = ServerSessionInterface()#as a restarted or another worker would see it
+    with client.session_transaction() as session:
+        assert session.get('id') == 1
@@ -0,0 +1,120 @@
+import pymysql
+import pytest
+from flask_app import db
+from flask_app.config.mysqlconnection import after_commit, configure_pool, connectToMySQL, get_pool, in_transaction
+from flask_app.config.orm import atomic, transaction
+from flask_app.models.question_model import Question
+from flask_app.models.answer_model import Answer
+
+def answer_count(id):
+    return connectToMySQL(db).query_db("SELECT answer_count FROM questions WHERE id=%(id)s",{"id" : id})[0]["answer_count"]
+
+def answers(text):
+    return connectToMySQL(db).query_db("SELECT id FROM answers WHERE answer=%(answer)s",{"answer" : text})
+
+def test_commit():
+    before = answer_count(1)
+    with transaction():
+        Answer.create(answer="committed",answerer_id=1,question_id=1)
+        assert in_transaction(db)
+    assert not in_transaction(db)
+    assert len(answers("committed")) == 1
+    assert answer_count(1) == before+1
+
+def test_rollback():
+    before = answer_count(1)
+    with pytest.raises(ValueError):
+        with transaction():
+            Answer.create(answer="rolled back",answerer_id=1,question_id=1)
+            raise ValueError
+    assert not answers("rolled back")
+    assert answer_count(1) == before
+
+def test_after_commit_runs_once_committed():
+    calls = []
+    with transaction():
+        after_commit(calls.append,"first")
+        after_commit(calls.append,"second")
+        assert calls == []
+    assert calls == ["first","second"]
+
+def test_after_commit_dropped_on_rollback():
+    calls = []
+    with pytest.raises(ValueError):
+        with transaction():
+            after_commit(calls.append,"dropped")
+            raise ValueError
+    assert calls == []
+    after_commit(calls.append,"now")#outside of a transaction it runs right away
+    assert calls == ["now"]
+
+def test_nested_transaction_joins_outer():
+    calls = []
+    with pytest.raises(ValueError):
+        with transaction() as outer:
+            with transaction() as inner:
+                assert inner is outer
+                Answer.create(answer="nested",answerer_id=1,question_id=1)
+                after_commit(calls.append,"inner")
+            assert calls == []#the inner block does not commit
+            raise ValueError
+    assert not answers("nested")
+    assert calls == []
+
+def test_atomic_retries_deadlocks():
+    attempts = []
+    @atomic(retries=3)
+    def create():
+        Answer.create(answer=f"attempt {len(attempts)}",answerer_id=1,question_id=1)
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise pymysql.err.OperationalError(1213,"Deadlock found when trying to get lock")
+    create()
+    assert len(attempts) == 3
+    assert not answers("attempt 0") and not answers("attempt 1")#the failed attempts were rolled back
+    assert len(answers("attempt 2")) == 1
+
+def test_atomic_gives_up_after_retries():
+    attempts = []
+    @atomic(retries=2)
+    def deadlock():
+        attempts.append(None)
+        raise pymysql.err.OperationalError(1213,"Deadlock found when trying to get lock")
+    with pytest.raises(pymysql.err.OperationalError):
+        deadlock()
+    assert len(attempts) == 3
+
+def test_atomic_does_not_retry_other_errors():
+    attempts = []
+    @atomic
+    def fail():
+        attempts.append(None)
+        raise pymysql.err.OperationalError(2013,"Lost connection to MySQL server during query")
+    with pytest.raises(pymysql.err.OperationalError):
+        fail()
+    assert len(attempts) == 1
+
+def test_nested_atomic_leaves_retrying_to_outer():
+    attempts = []
+    @atomic
+    def inner():
+        attempts.append(None)
+        raise pymysql.err.OperationalError(1213,"Deadlock found when trying to get lock")
+    with pytest.raises(pymysql.err.OperationalError):
+        with transaction():
+            inner()
+    assert len(attempts) == 1
+
+def test_lock_only_inside_transaction():
+    with pytest.raises(RuntimeError):
+        Question.retrieve_one(id=1,lock=True)
+    with transaction():
+        assert Question.retrieve_one(id=1,lock=True).id == 1
+
+def test_replaced_pool_closes_connections_released_later():
+    old = get_pool(db)
+    conn = old.acquire()
+    configure_pool(db,connect=old.connect)
+    old.release(conn)
+    assert old.closed and not conn.open
+    assert old.stats()["idle"] == 0 and old.stats()["open"] == 0